@@ -5,11 +5,9 @@ import pandas as pd
 from utils_streamlit import (
     load_config,
     load_preprocessed_dataset,
+    load_dataset_meta,
     get_dataset_notes,
     list_available_years,
-    # UF por ano
-    mean_valor_pago_by_uf_for_year,
-    fig_bar_mean_by_uf,
     # Região
     agg_total_invest_by_region,
     fig_bar_total_by_region,
@@ -17,15 +15,15 @@ from utils_streamlit import (
     agg_total_invest_by_area,
     fig_bar_total_by_area,
     # Categorias
-    agg_invest_by_category,
+    agg_invest_by_category_all,
     fig_bar_category,
     # Boxplots
-    agg_box_data_by_category,
+    compute_boxplots,
     fig_box_by_category,
-    agg_box_data_by_area,
     fig_box_by_area,
-    agg_box_data_by_area_and_category,
     fig_box_by_area_and_category,
+    agg_box_summary_by_area_and_category,
+    fig_box_summary_by_area_and_category,
     # Evolução temporal
     agg_time_mean_by_category,
     fig_time_mean_by_category,
@@ -137,16 +135,19 @@ if page == "Distribuição de verba":
         with col2:
             topn = st.slider("Limite de modalidades a exibir", min_value=5, max_value=40, value=10, step=5, width=500)
 
+        # as três métricas em uma única passada
+        agg_cat = agg_invest_by_category_all(df, year=year_cat)
+
         # soma total
-        agg_cat_sum = agg_invest_by_category(df, year=year_cat, how="sum")
+        agg_cat_sum = agg_cat["sum"]
         fig_cat_sum = fig_bar_category(agg_cat_sum, year_cat, metric_label="Total (R$)", top_n=topn)
 
         # média por beneficiário (ponderada)
-        agg_cat_benef = agg_invest_by_category(df, year=year_cat, how="per_beneficiary_mean")
+        agg_cat_benef = agg_cat["per_beneficiary_mean"]
         fig_cat_benef = fig_bar_category(agg_cat_benef, year_cat, metric_label="Média por beneficiário (R$)", top_n=topn)
 
         # média por processo (ponderada)
-        agg_cat_proc = agg_invest_by_category(df, year=year_cat, how="per_process_mean")
+        agg_cat_proc = agg_cat["per_process_mean"]
         fig_cat_proc = fig_bar_category(agg_cat_proc, year_cat, metric_label="Média por processo (R$)", top_n=topn)
 
         col1, col2 = st.columns([1,1], gap="small")
@@ -198,17 +199,26 @@ elif page=="Valor médio da bolsa":
         level_box = st.selectbox("Nível (área)", ["GRANDE_AREA", "AREA", "SUBAREA"], index=1)
         level_opt_box = st.selectbox("Área", options=df[level_box].unique(), index=1)
 
+    # recortes por categoria e por área; o combinado só quando não há facet (o facet usa o resumo)
+    boxes = compute_boxplots(df, year=year_box, level=level_box, level_val=level_opt_box, category=cat_box,
+                             combined=not facet_on)
+
     # Por categoria
-    df_box_cat = agg_box_data_by_category(df, year=year_box, category=cat_box)
+    df_box_cat = boxes["category"]
     fig_box_cat = fig_box_by_category(df_box_cat, year_box, modalidade=cat_box)
 
     # Por área
-    df_box_area = agg_box_data_by_area(df, year=year_box, level=level_box, level_val=level_opt_box)
+    df_box_area = boxes["area"]
     fig_box_area_plot = fig_box_by_area(df_box_area, year=year_box, level=level_box, level_val=level_opt_box)
 
     # Combinado
-    df_box_comb = agg_box_data_by_area_and_category(df, year=year_box, level=level_box, category=cat_box, level_val=level_opt_box)
-    fig_box_comb = fig_box_by_area_and_category(df_box_comb, year=year_box, level=level_box, facet=facet_on)
+    if facet_on:
+        # facet sem outliers: quartis/cercas calculados aqui, a figura leva só uma linha por grupo
+        df_box_comb = agg_box_summary_by_area_and_category(df, year=year_box, level=level_box, category=cat_box, level_val=level_opt_box)
+        fig_box_comb = fig_box_summary_by_area_and_category(df_box_comb, year=year_box, level=level_box)
+    else:
+        df_box_comb = boxes["combined"]
+        fig_box_comb = fig_box_by_area_and_category(df_box_comb, year=year_box, level=level_box, facet=False)
 
     col1, col2 = st.columns([1, 1], gap="large")
     with col1:
@@ -243,7 +253,13 @@ elif page=="Evolução temporal":
 # Debug mínimo opcional
 with st.expander("🔎 Debug rápido"):
     logger = get_logger()
-    cnt = df.assign(_ano=pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce")).groupby("_ano").size().reset_index(name="rows")
+    meta = load_dataset_meta()
+    if meta is not None and meta.get("year_counts"):
+        # contagens gravadas no build (sidecar _meta.json)
+        cnt = pd.DataFrame({"ANO_REFERENCIA": [int(k) for k in meta["year_counts"]],
+                            "rows": list(meta["year_counts"].values())})
+    else:
+        cnt = df.groupby("ANO_REFERENCIA", observed=True).size().reset_index(name="rows")
     st.write("Contagem por ano:")
     st.dataframe(cnt, hide_index=True, use_container_width=True)
     st.write("Tipos:")
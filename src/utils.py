@@ -4,12 +4,22 @@ from __future__ import annotations
 
 import os
 import re
+import csv
+import json
+import itertools
 import yaml
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import queue
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
 
 # =============================
@@ -53,9 +63,10 @@ def ensure_dir(path: str) -> None:
 # =============================
 
 _LOGGER: Optional[logging.Logger] = None
+_LISTENER: Optional[QueueListener] = None
 
 def get_logger() -> logging.Logger:
-    global _LOGGER
+    global _LOGGER, _LISTENER
     if _LOGGER is not None:
         return _LOGGER
 
@@ -75,7 +86,13 @@ def get_logger() -> logging.Logger:
     fh = RotatingFileHandler(log_path, maxBytes=1_000_000, backupCount=5, encoding="utf-8")
     fmt = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
     fh.setFormatter(fmt)
-    logger.addHandler(fh)
+
+    # a escrita em disco roda numa thread própria: quem loga só enfileira o record
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(q))
+    _LISTENER = QueueListener(q, fh, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)  # esvazia a fila ao sair do processo
 
     # silencioso no console (Streamlit já printa)
     logger.propagate = False
@@ -85,20 +102,46 @@ def get_logger() -> logging.Logger:
     return logger
 
 
+class _ArgsSummary:
+    """
+    Resumo dos argumentos para o log (DataFrames viram shape + primeiras colunas).
+    Só é montado quando o logging formata a mensagem (%s chama __str__).
+    """
+    __slots__ = ("args", "kwargs")
+
+    def __init__(self, args: tuple, kwargs: dict):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return _describe_args(self.args, self.kwargs)
+
+
+def _describe_args(args: tuple, kwargs: dict) -> str:
+    parts = []
+    for i, a in enumerate(args):
+        if isinstance(a, pd.DataFrame):
+            parts.append(f"arg_df[{i}] shape={a.shape} cols={list(a.columns)[:8]}")
+    for k, v in kwargs.items():
+        if isinstance(v, pd.DataFrame):
+            parts.append(f"kw_df[{k}] shape={v.shape} cols={list(v.columns)[:8]}")
+        else:
+            parts.append(f"{k}={v}")
+    return "; ".join(parts)
+
+
 def log_call(fn):
     """Decorator simples para logar entrada/saída das funções utilitárias."""
+    lg: Optional[logging.Logger] = None
     def wrapper(*args, **kwargs):
-        lg = get_logger()
+        nonlocal lg
+        if lg is None:
+            lg = get_logger()  # resolvido uma vez por função decorada
         try:
-            lg.info("call_start | fn=%s", fn.__name__)
-            for i, a in enumerate(args):
-                if isinstance(a, pd.DataFrame):
-                    lg.info("arg_df | idx=%d | shape=%s | cols=%s", i, a.shape, list(a.columns)[:8])
-            for k, v in kwargs.items():
-                if isinstance(v, pd.DataFrame):
-                    lg.info("kw_df | key=%s | shape=%s | cols=%s", k, v.shape, list(v.columns)[:8])
-                else:
-                    lg.info("kw | %s=%s", k, v)
+            if not lg.isEnabledFor(logging.INFO):
+                # acima de INFO: sem introspecção dos args, só o log de erro
+                return fn(*args, **kwargs)
+            lg.info("call_start | fn=%s | args=%s", fn.__name__, _ArgsSummary(args, kwargs))
 
             out = fn(*args, **kwargs)
 
@@ -116,27 +159,69 @@ def log_call(fn):
 # Cache anual em Parquet
 # ============================
 
+# Row groups menores que um ano inteiro: com estatísticas (min/max) por row group,
+# leitores com filtro em ANO_REFERENCIA pulam os grupos dos outros anos.
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+# ZSTD nível 3 + dicionário: colunas repetitivas (UF, região, modalidade, área) viram
+# códigos no arquivo; decodifica quase tão rápido quanto snappy com arquivo bem menor.
+PARQUET_WRITE_OPTIONS = dict(
+    compression="zstd",
+    compression_level=3,
+    use_dictionary=True,
+    write_statistics=True,
+    data_page_size=1 << 20,
+)
+
+# Strings da pipeline: StringDtype com backend Arrow (buffers contíguos, métodos .str
+# nos kernels C++ do pyarrow.compute, ~4x menos memória que um objeto str por valor)
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+# string/large_string do Arrow -> STRING_DTYPE, sem passar por objetos str do Python
+_ARROW_STRING_MAPPER = {
+    pa.string(): STRING_DTYPE,
+    pa.large_string(): STRING_DTYPE,
+}.get
+
 def _yearly_parquet_path(paths: Dict[str, str], year: int) -> str:
     fname = f"cnpq_pagamentos_{year}.parquet"
     return os.path.join(paths["data_parquet_yearly"], fname)
 
+# Versão do esquema do cache anual (dtypes de coerce_types), gravada no rodapé do Parquet.
+# Mudou a coerção (dtypes/colunas)? Incrementa: caches antigos são ignorados e refeitos.
+YEAR_CACHE_SCHEMA_VERSION = "2"
+_SCHEMA_KEY = b"cnpq_schema_version"
+
 def save_year_parquet(df: pd.DataFrame, year: int, paths: Dict[str, str]) -> str:
     """
     Salva df anual normalizado/coagido em Parquet, para reuso.
+    Os dtypes vão no metadado do pandas e a versão do esquema no do Parquet,
+    então a releitura não precisa passar de novo por coerce_types.
     """
     p = _yearly_parquet_path(paths, year)
     ensure_dir(os.path.dirname(p))
-    df.to_parquet(p, index=False)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           _SCHEMA_KEY: YEAR_CACHE_SCHEMA_VERSION.encode()})
+    pq.write_table(table, p, row_group_size=PARQUET_ROW_GROUP_SIZE, **PARQUET_WRITE_OPTIONS)
     get_logger().info("year_parquet_saved | year=%s | path=%s | shape=%s", year, p, df.shape)
     return p
 
 def load_year_parquet_if_exists(year: int, paths: Dict[str, str]) -> Optional[pd.DataFrame]:
     """
-    Se existir o Parquet anual, carrega e retorna; senão, None.
+    Se existir o Parquet anual com a versão de esquema atual, carrega e retorna
+    (já tipado, sem coerção); senão, None.
     """
     p = _yearly_parquet_path(paths, year)
     if os.path.exists(p):
-        df = pd.read_parquet(p)
+        # só o rodapé: cache de outra versão nem é lido
+        version = (pq.read_schema(p).metadata or {}).get(_SCHEMA_KEY, b"").decode()
+        if version != YEAR_CACHE_SCHEMA_VERSION:
+            get_logger().warning("year_parquet_stale | year=%s | path=%s | version=%s | expected=%s",
+                                 year, p, version or None, YEAR_CACHE_SCHEMA_VERSION)
+            return None
+        # strings voltam como STRING_DTYPE (o metadado do pandas só guarda "string")
+        df = pq.read_table(p).to_pandas(types_mapper=_ARROW_STRING_MAPPER)
         get_logger().info("year_parquet_loaded | year=%s | path=%s | shape=%s", year, p, df.shape)
         return df
     return None
@@ -146,31 +231,27 @@ def load_year_parquet_if_exists(year: int, paths: Dict[str, str]) -> Optional[pd
 # Seção 1 - Descoberta de arquivos em data/raw
 # ==============================================
 
+# Padrões (flexíveis) para nomes citados, em uma única alternação; o grupo que casar dá a chave
+RAW_FILE_PATTERN = re.compile(
+    r"(?P<y2022>Relatorio*)|(?P<y2023>Dados-de-Pagamento-2023-PDA*)|(?P<y2024>20250204*)",
+    re.I,
+)
+
 def discover_raw_files(data_raw: str) -> Dict[str, str]:
     """
     Descobre os três arquivos nas convenções informadas.
     Retorna um dict { 'y2022': <path>, 'y2023': <path>, 'y2024': <path> }.
     Levemente tolerante a variações de maiúsculas/minúsculas.
     """
-    files = os.listdir(data_raw)
-
-    # Padrões (flexíveis) para nomes citados
-    patt_2022 = re.compile(r"Relatorio*", re.I)
-    patt_2023 = re.compile(r"Dados-de-Pagamento-2023-PDA*", re.I)
-    patt_2024 = re.compile(r"20250204*", re.I)
-
     out = {}
-    for f in files:
-        full = os.path.join(data_raw, f)
-        if not os.path.isfile(full):
-            continue
-        low = f.lower()
-        if patt_2022.search(low):
-            out["y2022"] = full
-        elif patt_2023.search(low):
-            out["y2023"] = full
-        elif patt_2024.search(low):
-            out["y2024"] = full
+    # scandir: is_file() usa o dirent, sem um stat extra por entrada
+    with os.scandir(data_raw) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            m = RAW_FILE_PATTERN.search(entry.name)
+            if m:
+                out[m.lastgroup] = entry.path
 
     required = {"y2022", "y2023", "y2024"}
     missing = required.difference(out.keys())
@@ -185,15 +266,71 @@ def discover_raw_files(data_raw: str) -> Dict[str, str]:
 # Seção 2 - Leitura dos CSVs por ano
 # ==========================================
 
-def _read_csv_flexible(path: str, header_row: int, sep_override: Optional[str] = None) -> pd.DataFrame:
+def _locate_header(path: str, header_row: int, encoding: str) -> Tuple[int, List[str]]:
+    """
+    Acha a linha física do header: 'header_row' conta só linhas não vazias,
+    como o pandas (skip_blank_lines=True). Retorna (linhas a pular, amostra
+    com o header e algumas linhas de dados, para o sniff do separador).
+    """
+    with open(path, "r", encoding=encoding, newline="") as fh:
+        nonblank = 0
+        for i, line in enumerate(fh):
+            if not line.strip():
+                continue
+            if nonblank == header_row:
+                return i, [line] + list(itertools.islice(fh, 20))
+            nonblank += 1
+    raise ValueError(f"header_row={header_row} além do fim de {path}")
+
+
+def _read_csv_arrow(path: str, header_row: int, sep_override: Optional[str], encoding: str,
+                    usecols: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
+    """
+    Leitura via pyarrow.csv (parser C++ multithread), todas as colunas como string.
+    usecols: filtro sobre o nome do header; colunas recusadas nem são convertidas.
+    """
+    skip, sample = _locate_header(path, header_row, encoding)
+    sep = sep_override
+    if sep is None:
+        try:
+            sep = csv.Sniffer().sniff("".join(sample), delimiters=",;\t|").delimiter
+        except csv.Error:
+            sep = ","
+    names = next(csv.reader([sample[0].lstrip("\ufeff")], delimiter=sep))
+    include = [n for n in names if usecols(n)] if usecols is not None else []
+
+    table = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(skip_rows=skip, encoding=encoding),
+        parse_options=pacsv.ParseOptions(delimiter=sep),
+        convert_options=pacsv.ConvertOptions(
+            column_types={n: pa.string() for n in names},
+            strings_can_be_null=True,
+            include_columns=include,
+        ),
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _read_csv_flexible(path: str, header_row: int, sep_override: Optional[str] = None,
+                       usecols: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
     """
     Lê CSV com header em 'header_row' (0-based).
     - Se sep_override vier, usa-o diretamente (ex.: ';' no 2024).
-    - Caso contrário, tenta sniff (engine='python', sep=None).
-    Tenta encodings comuns do BR.
+    - Caso contrário, faz sniff do separador a partir da linha de header.
+    - usecols (nome do header -> bool) projeta as colunas já na leitura.
+    Tenta encodings comuns do BR com o leitor do pyarrow; se nenhum servir,
+    cai no pandas (engine='python', sep=None), mais lento porém mais tolerante.
     """
     encodings = ("utf-8", "utf-8-sig", "latin-1", "cp1252")
     errs = []
+    for enc in encodings:
+        try:
+            return _read_csv_arrow(path, header_row, sep_override, enc, usecols)
+        except (UnicodeDecodeError, ValueError, pa.ArrowInvalid) as e:
+            errs.append((enc, "arrow", str(e)))
+
+    get_logger().warning("csv_arrow_fallback | path=%s | errs=%s", path, errs)
     for enc in encodings:
         try:
             df = pd.read_csv(
@@ -203,14 +340,15 @@ def _read_csv_flexible(path: str, header_row: int, sep_override: Optional[str] =
                 sep=(sep_override if sep_override is not None else None),
                 dtype=str,
                 encoding=enc,
+                usecols=usecols,
             )
             return df
         except Exception as e:
-            errs.append((enc, str(e)))
+            errs.append((enc, "pandas", str(e)))
     raise RuntimeError(f"Falha ao ler {path} (sep={sep_override}) com encodings: {errs}")
 
 
-def read_2024(path: str) -> pd.DataFrame:
+def read_2024(path: str, usecols: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
     """
     2024:
       - header na linha 1 (1-based), header_row=0
@@ -218,26 +356,26 @@ def read_2024(path: str) -> pd.DataFrame:
       - dados iniciam na 2
     """
     # Força ';' porque a planilha 2024 é CSV semicolon (pt-BR).
-    return _read_csv_flexible(path, header_row=0, sep_override=";")
+    return _read_csv_flexible(path, header_row=0, sep_override=";", usecols=usecols)
 
 
 
-def read_2022(path: str) -> pd.DataFrame:
+def read_2022(path: str, usecols: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
     """
     2022:
       - header na linha 6 (1-based), ou seja header_row=5
       - dados iniciam na 7
     """
-    return _read_csv_flexible(path, header_row=5)
+    return _read_csv_flexible(path, header_row=5, usecols=usecols)
 
 
-def read_2023(path: str) -> pd.DataFrame:
+def read_2023(path: str, usecols: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
     """
     2023:
       - header na linha 8 (1-based), header_row=7
       - dados iniciam na 9
     """
-    return _read_csv_flexible(path, header_row=7)
+    return _read_csv_flexible(path, header_row=7, usecols=usecols)
 
 
 # ==================================================
@@ -371,29 +509,34 @@ MAP_2024 = {
 }
 
 
+def canonical_usecols(mapping: Dict[str, str]) -> Callable[[str], bool]:
+    """
+    Filtro de colunas para os leitores: mantém só os nomes de header que
+    normalize_columns(df, mapping) levaria para CANONICAL_COLS (mesmo strip + mapping).
+    """
+    canonical = set(CANONICAL_COLS)
+    return lambda c: mapping.get(str(c).strip(), str(c).strip()) in canonical
+
+
 def normalize_columns(df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
     """
     Renomeia colunas de df conforme mapping, remove espaços extras e
     retorna apenas colunas mapeadas, sem perder a ordem canônica.
     """
-    # Primeiro, strip em colunas
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
-
-    # Aplica mapping específico do ano
-    df = df.rename(columns=mapping)
+    # strip nos nomes + mapping específico do ano num único rename (já devolve um df novo)
+    df = df.rename(columns=lambda c: mapping.get(str(c).strip(), str(c).strip()))
 
-    # Mantém apenas as colunas canônicas existentes
-    keep = [c for c in CANONICAL_COLS if c in df.columns]
-    df = df[keep]
+    # reindex filtra, reordena e cria as faltantes numa chamada só
+    missing = [c for c in CANONICAL_COLS if c not in df.columns]
+    df = df.reindex(columns=CANONICAL_COLS)
 
-    # Garante que TODAS as CANONICAL_COLS existam (mesmo se vazias)
-    for col in CANONICAL_COLS:
-        if col not in df.columns:
-            df[col] = pd.NA
-
-    # Reordena
-    return df[CANONICAL_COLS]
+    # Faltantes saem do reindex como float NaN: retipadas como string do Arrow
+    # (o tipo do leitor), para o concat entre anos não depender de colunas só-NA
+    if missing:
+        na = pd.Series(pd.NA, index=df.index, dtype=pd.ArrowDtype(pa.string()))
+        for col in missing:
+            df[col] = na
+    return df
 
 
 # =================================================
@@ -430,51 +573,129 @@ STRIP_UPPER_COLS = [
     "NATUREZA_DESPESA",
 ]
 
+# Padrões compilados uma vez no import (e não a cada chamada/ano)
+# símbolos de moeda e separadores removidos de VALOR_PAGO
+_RE_CURRENCY_JUNK = re.compile(r"R\$|\$|\,|\.")
+# tudo que não é letra, removido das siglas de UF (o .pattern vai para o pyarrow.compute)
+_RE_NON_AZ = re.compile(r"[^A-Z]")
+# primeiro ano com 4 dígitos em ANO_REFERENCIA
+_RE_YEAR4 = re.compile(r"(\d{4})")
+
 def parse_brazilian_currency_to_float(s: pd.Series) -> pd.Series:
     """
     Converte strings de moeda BR -> float.
     Robusto para "R$ 1.234,56", " $ 8,100.00 ", "600,00", "300.0".
     Remove R$, $, espaços, e aspas.
+    Os valores se repetem muito entre linhas: a limpeza roda só sobre os valores
+    distintos (pd.factorize) e o resultado é espalhado de volta pelos códigos.
     """
     if pd.api.types.is_numeric_dtype(s):
         return s.astype(float)
-    
-    s_str = s.astype("string").str.strip()
-    s_str = s_str.str.strip('"')
-    
-    # Remove símbolos de moeda (R$ ou $) e espaços em branco
-    s_str = s_str.str[:-3]
-    s_str = s_str.str.replace(r"R\$|\$|\,|\.", "", regex=True).str.strip()
-    
-    # # Se ainda tivermos '.' e ',', a vírgula é o decimal (formato BR)
-    # # Ex: "1.234,56"
-    # is_br_format = s_str.str.contains(r"\.", regex=False) & s_str.str.contains(r",", regex=False)
-    
-    # # Se tiver só vírgula, ela é o decimal (formato BR simplificado)
-    # # Ex: "600,00"
-    # is_simple_br = s_str.str.contains(r",", regex=False) & ~s_str.str.contains(r"\.", regex=False)
 
-    # # Aplica a limpeza
-    
-    # # Formato BRL (1.234,56 -> 1234.56)
-    # s_br = s_str.where(is_br_format | is_simple_br)
-    # s_br = s_br.str.replace(r"\.", "", regex=False).str.replace(r",", ".", regex=False)
+    codes, uniques = pd.factorize(s)
+    u = pd.Series(uniques).astype(STRING_DTYPE).str.strip().str.strip('"')
+    # .pattern (str): com padrão compilado o pandas sai do kernel Arrow e volta ao re do Python
+    u = u.str[:-3].str.replace(_RE_CURRENCY_JUNK.pattern, "", regex=True).str.strip()
+    parsed = pd.to_numeric(u, errors="coerce")
 
-    # # O que sobrar (formato "300.0" ou "1500")
-    # s_other = s_str.where(~(is_br_format | is_simple_br))
-    # # Apenas remove vírgulas de milhar (se houver, ex: 1,500)
-    # s_other = s_other.str.replace(r",", "", regex=False)
+    # take com allow_fill: código -1 (NA na entrada) vira NA na saída
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=s.index, name=s.name)
 
-    # # Combina
-    # s_final = s_br.fillna(s_other)
 
-    return pd.to_numeric(s_str, errors="coerce")
+# Formatos testados antes do format='mixed' (que cai no parser elemento a elemento)
+DATE_FORMAT_CANDIDATES = ["%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S"]
+
+def _detect_date_format(values: pd.Series, sample_size: int = 50) -> Optional[str]:
+    """Primeiro formato de DATE_FORMAT_CANDIDATES que parseia toda a amostra; None se nenhum."""
+    sample = values.dropna().head(sample_size)
+    if sample.empty:
+        return None
+    for fmt in DATE_FORMAT_CANDIDATES:
+        try:
+            pd.to_datetime(sample, format=fmt)
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def _to_datetime_cached(s: pd.Series) -> pd.Series:
+    """
+    pd.to_datetime só sobre as datas distintas (poucos milhares num ano inteiro),
+    espalhadas de volta pelos códigos do factorize. Com formato detectado, usa o
+    strptime em C; o que não casar com ele vai para a regra de antes
+    (dayfirst, format='mixed'). Inválidas -> NaT.
+    """
+    codes, uniques = pd.factorize(s)
+    values = pd.Series(uniques, dtype=object)
+    fmt = _detect_date_format(values)
+    if fmt is None:
+        parsed = pd.to_datetime(values, dayfirst=True, errors="coerce", format="mixed")
+    else:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+        rest = parsed.isna() & values.notna()
+        if rest.any():
+            parsed[rest] = pd.to_datetime(values[rest], dayfirst=True, errors="coerce", format="mixed")
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=s.index, name=s.name)
+
+
+# Colunas codificadas (de poucas unidades a poucos milhares de valores distintos):
+# gravadas como category -> dicionário no Parquet, e voltam como category na leitura
+CATEGORY_COLS = [
+    "NATUREZA_DESPESA",
+    "REGIAO_DESTINO",
+    "GRANDE_AREA",
+    "UO",
+    "LINHA_FOMENTO",
+    "SIGLA_UF_ORIGEM",
+    "SIGLA_UF_DESTINO",
+    "CATEGORIA_NIVEL",
+    "PAIS_ORIGEM",
+    "MODALIDADE",
+    "PAIS_DESTINO",
+    "AREA",
+    "PROGRAMA_CNPQ",
+    "CIDADE_DESTINO",
+    "NOME_CHAMADA",
+    "SUBAREA",
+    "SIGLA_INSTITUICAO_MACRO",
+    "SIGLA_INSTITUICAO_DESTINO",
+    "INSTITUICAO_ORIGEM",
+    "INSTITUICAO_DESTINO",
+]
+
+# Texto livre / alta cardinalidade: strip direto na coluna (quase todo valor é distinto)
+FREE_TEXT_COLS = ("TITULO_PROJETO", "PALAVRA_CHAVE", "BENEFICIARIO")
+
+def _strip_upper_distinct(s: pd.Series, upper: bool = True) -> pd.Series:
+    """
+    strip (+ upper) como string, aplicado só aos valores distintos da coluna
+    (UFs, áreas, modalidades...: dezenas/centenas de valores em milhões de linhas).
+    """
+    codes, uniques = pd.factorize(s)
+    u = pd.Series(uniques).astype(STRING_DTYPE).str.strip()
+    if upper:
+        u = u.str.upper()
+    return pd.Series(u.array.take(codes, allow_fill=True), index=s.index, name=s.name)
+
+
+def _normalize_uf(s: pd.Series) -> pd.Series:
+    """
+    Sigla de UF: maiúsculas, só A-Z, até 3 caracteres. Roda nos kernels C++ do
+    pyarrow.compute (sem regex do Python por elemento), sobre os valores distintos.
+    """
+    codes, uniques = pd.factorize(s)
+    arr = pa.array(pd.Series(uniques).astype(STRING_DTYPE))
+    arr = pc.utf8_slice_codeunits(pc.replace_substring_regex(pc.utf8_upper(arr), _RE_NON_AZ.pattern, ""), 0, 3)
+    u = pd.array(arr, dtype=STRING_DTYPE)
+    return pd.Series(u.take(codes, allow_fill=True), index=s.index, name=s.name)
 
 
 @log_call
 def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
     lg = get_logger()
-    df = df.copy()
+    # cópia rasa: as colunas abaixo são substituídas inteiras, sem escrever nos arrays do chamador
+    df = df.copy(deep=False)
 
     # Datas (robusto para formatos com ou sem hora)
     for c in DATE_COLS:
@@ -482,20 +703,15 @@ def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
             # Tenta parsear, extraindo apenas a data (ignora a hora)
             # O format='mixed' e dayfirst=True ajudam a pegar
             # "dd/mm/yyyy" e "dd/mm/yyyy HH:MM:SS"
-            df[c] = pd.to_datetime(
-                df[c], 
-                dayfirst=True, 
-                errors="coerce",
-                format='mixed' 
-            )
+            df[c] = _to_datetime_cached(df[c])
 
     # Strings (strip/upper onde convém)
     for c in STRIP_UPPER_COLS:
         if c in df.columns:
-            df[c] = df[c].astype("string").str.strip()
-            if c in ("TITULO_PROJETO", "PALAVRA_CHAVE", "BENEFICIARIO"):
+            if c in FREE_TEXT_COLS:
+                df[c] = df[c].astype(STRING_DTYPE).str.strip()
                 continue
-            df[c] = df[c].str.upper()
+            df[c] = _strip_upper_distinct(df[c])
 
     # Valor pago (agora usando a nova função robusta)
     if "VALOR_PAGO" in df.columns:
@@ -510,12 +726,12 @@ def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
     # UF normalização
     for c in ("SIGLA_UF_ORIGEM", "SIGLA_UF_DESTINO"):
         if c in df.columns:
-            df[c] = df[c].astype("string").str.upper().str.replace(r"[^A-Z]", "", regex=True).str[:3]
+            df[c] = _normalize_uf(df[c])
 
     # Ano referência — extrai 4 dígitos de qualquer coisa (robusto pra 2024)
     if "ANO_REFERENCIA" in df.columns:
-        raw_year = df["ANO_REFERENCIA"].astype("string")
-        extracted = raw_year.str.extract(r"(\d{4})", expand=False)
+        raw_year = df["ANO_REFERENCIA"].astype(STRING_DTYPE)
+        extracted = raw_year.str.extract(_RE_YEAR4, expand=False)
         df["ANO_REFERENCIA"] = pd.to_numeric(extracted, errors="coerce").astype("Int64")
         lg.info(
             "ano_ref_parse | unique_years=%s",
@@ -532,51 +748,58 @@ def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
 # Seção 5 - Harmonização, união e salvamento
 # ==========================================
 
+# ano -> (leitor do CSV bruto, chave em discover_raw_files, mapping de colunas)
+YEAR_SOURCES = {
+    2022: (read_2022, "y2022", MAP_2022),
+    2023: (read_2023, "y2023", MAP_2023),
+    2024: (read_2024, "y2024", MAP_2024),
+}
+
+def _read_year_raw(year: int, found: Dict[str, str]) -> pd.DataFrame:
+    """CSV bruto do ano -> colunas canônicas, ainda sem coerção de tipos."""
+    reader, key, mapping = YEAR_SOURCES[year]
+    # projeção na leitura: colunas fora do esquema canônico nem saem do CSV
+    return normalize_columns(reader(found[key], usecols=canonical_usecols(mapping)), mapping)
+
+
 def load_and_standardize_all(paths: Dict[str, str]) -> Dict[str, pd.DataFrame]:
     """
     Para cada ano:
       1) tenta carregar o Parquet anual do cache;
-      2) se não existir, lê CSV bruto, normaliza, coage tipos e salva o Parquet anual;
+      2) se não existir, lê CSV bruto e normaliza as colunas (anos em paralelo, threads).
+    Os anos lidos do CSV são concatenados e passam por coerce_types uma única vez
+    (datas, moedas e strings distintas são parseadas uma vez para todos os anos);
+    depois o resultado é fatiado de volta por ano e cada Parquet anual é salvo.
     Retorna dict {"2022": df22, "2023": df23, "2024": df24}.
     """
     found = discover_raw_files(paths["data_raw"])
 
     out: Dict[str, pd.DataFrame] = {}
+    missing: List[int] = []
+    for year in YEAR_SOURCES:
+        cached = load_year_parquet_if_exists(year, paths)
+        if cached is not None:
+            out[str(year)] = cached
+        else:
+            missing.append(year)
 
-    # 2022
-    df22_cached = load_year_parquet_if_exists(2022, paths)
-    if df22_cached is not None:
-        out["2022"] = df22_cached
-    else:
-        df22 = read_2022(found["y2022"])
-        df22 = normalize_columns(df22, MAP_2022)
-        df22 = coerce_types(df22)
-        save_year_parquet(df22, 2022, paths)
-        out["2022"] = df22
-
-    # 2023
-    df23_cached = load_year_parquet_if_exists(2023, paths)
-    if df23_cached is not None:
-        out["2023"] = df23_cached
-    else:
-        df23 = read_2023(found["y2023"])
-        df23 = normalize_columns(df23, MAP_2023)
-        df23 = coerce_types(df23)
-        save_year_parquet(df23, 2023, paths)
-        out["2023"] = df23
-
-    # 2024
-    df24_cached = load_year_parquet_if_exists(2024, paths)
-    if df24_cached is not None:
-        out["2024"] = df24_cached
-    else:
-        df24 = read_2024(found["y2024"])
-        df24 = normalize_columns(df24, MAP_2024)
-        df24 = coerce_types(df24)
-        save_year_parquet(df24, 2024, paths)
-        out["2024"] = df24
+    if missing:
+        get_logger().info("years_from_csv | years=%s", missing)
+        # Anos independentes em threads: pyarrow.csv e o writer do Parquet soltam o GIL.
+        # Processos perderiam a coerção única abaixo e teriam que serializar os dfs.
+        with ThreadPoolExecutor(max_workers=len(missing)) as ex:
+            pending = dict(zip(missing, ex.map(lambda y: _read_year_raw(y, found), missing)))
 
-    return out
+        sizes = [len(df) for df in pending.values()]
+        coerced = coerce_types(pd.concat(list(pending.values()), axis=0, ignore_index=True))
+        bounds = np.cumsum([0] + sizes)
+        for year, lo, hi in zip(pending, bounds[:-1], bounds[1:]):
+            out[str(year)] = coerced.iloc[lo:hi].reset_index(drop=True)
+
+        with ThreadPoolExecutor(max_workers=len(missing)) as ex:
+            list(ex.map(lambda y: save_year_parquet(out[str(y)], y, paths), missing))
+
+    return {str(y): out[str(y)] for y in YEAR_SOURCES}
 
 
 def _common_cols_across(dfs: Dict[str, pd.DataFrame]) -> List[str]:
@@ -590,6 +813,16 @@ def _common_cols_across(dfs: Dict[str, pd.DataFrame]) -> List[str]:
     ordered = ["ANO_REFERENCIA"] + sorted([c for c in common if c != "ANO_REFERENCIA"])
     return ordered
 
+def _stable_order(df: pd.DataFrame, cols: List[str]) -> np.ndarray:
+    """
+    Posições que ordenam df por cols, como sort_values(kind="mergesort", na_position="last"),
+    via pyarrow.compute.sort_indices (estável, nulos no fim) sobre colunas Arrow.
+    """
+    tbl = pa.table({c: pa.array(df[c], from_pandas=True) for c in cols})
+    idx = pc.sort_indices(tbl, sort_keys=[(c, "ascending") for c in cols])
+    return idx.to_numpy()
+
+
 @log_call
 def unify_pagamentos(dfs: Dict[str, pd.DataFrame]) -> pd.DataFrame:
     """
@@ -605,29 +838,45 @@ def unify_pagamentos(dfs: Dict[str, pd.DataFrame]) -> pd.DataFrame:
     # (com NA onde o dado não existia).
     # Não precisamos de "interseção", apenas concatenar.
     
-    # Garante a ordem das colunas para a concatenação
+    # Garante a ordem das colunas para a concatenação; df[CANONICAL_COLS] copia
+    # o frame inteiro, então só seleciona quando a ordem de fato difere
     aligned_dfs = [
-        dfs["2022"][CANONICAL_COLS],
-        dfs["2023"][CANONICAL_COLS],
-        dfs["2024"][CANONICAL_COLS]
+        d if list(d.columns) == CANONICAL_COLS else d[CANONICAL_COLS]
+        for d in (dfs["2022"], dfs["2023"], dfs["2024"])
     ]
-    
+
+    # colunas Arrow (string[pyarrow]) só têm os chunks encadeados, sem memcpy
     out = pd.concat(aligned_dfs, axis=0, ignore_index=True)
     lg.info("unify_concatenated | shape=%s | cols=%s", out.shape, out.columns.tolist())
 
-    # 3) Limpa linhas sem info chave
+    # 3) Linhas sem info chave + 4) ordem por ano/processo (estável, NA por último,
+    # kernel de sort do Arrow): as duas viram um único vetor de posições e um único take
     key_cols = ["ANO_REFERENCIA", "PROCESSO", "VALOR_PAGO"]
-    out = out.dropna(axis=0, how="all", subset=key_cols)
-    lg.info("unify_dropna | shape=%s", out.shape)
+    empty = out[key_cols].isna().all(axis=1).to_numpy()
+    lg.info("unify_dropna | shape=%s", (out.shape[0] - int(empty.sum()), out.shape[1]))
 
-    # 4) Ordena
-    sort_cols = ["ANO_REFERENCIA", "PROCESSO"]
-    out = out.sort_values(by=sort_cols, na_position="last", kind="mergesort").reset_index(drop=True)
+    order = _stable_order(out, ["ANO_REFERENCIA", "PROCESSO"])
+    if empty.any():
+        order = order[~empty[order]]
+    out = out.take(order).reset_index(drop=True)
     lg.info("unify_sorted | shape=%s", out.shape)
 
     return out
 
 
+def _csv_table(table: pa.Table, df: pd.DataFrame) -> pa.Table:
+    """
+    Datas no mesmo texto do df.to_csv: colunas datetime sem hora saem como
+    YYYY-MM-DD (date32), as demais em segundos, sem os nanossegundos do Arrow.
+    """
+    for c in df.select_dtypes(include="datetime").columns:
+        s = df[c].dropna()
+        target = pa.date32() if (s == s.dt.normalize()).all() else pa.timestamp("s")
+        i = table.schema.get_field_index(c)
+        table = table.set_column(i, c, pc.cast(table[c], target, safe=False))
+    return table
+
+
 @log_call
 def save_preprocessed(
     df: pd.DataFrame, 
@@ -635,7 +884,8 @@ def save_preprocessed(
     write_csv: bool | None = None
 ) -> Dict[str, str]:
     """
-    Salva o dataset unificado. Por padrão salva somente Parquet.
+    Salva o dataset unificado. Por padrão salva somente Parquet,
+    mais um sidecar <base>_meta.json (linhas por ano, dtypes, colunas) para o dashboard.
     CSV só é escrito se:
       - write_csv=True, OU
       - variável de ambiente WRITE_CSV == "1".
@@ -649,8 +899,27 @@ def save_preprocessed(
         cols = ["ANO_REFERENCIA"] + [c for c in cols if c != "ANO_REFERENCIA"]
         df = df[cols]
 
+    # category -> coluna dictionary no Parquet (preservada pelo pyarrow na releitura)
+    df = df.astype({c: "category" for c in CATEGORY_COLS if c in df.columns})
+
+    # uma conversão pandas -> Arrow só, reaproveitada pelo Parquet e pelo CSV
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # unify_pagamentos já ordena por ano: cada row group cobre (quase) um ano só
     out_parquet = f"{base}.parquet"
-    df.to_parquet(out_parquet, index=False)
+    pq.write_table(table, out_parquet, row_group_size=PARQUET_ROW_GROUP_SIZE, **PARQUET_WRITE_OPTIONS)
+
+    # metadados pré-calculados: o painel de debug não precisa reagrupar o df a cada rerun
+    out_meta = f"{base}_meta.json"
+    meta = {
+        "rows": int(len(df)),
+        "year_counts": {str(int(k)): int(v) for k, v in df.groupby("ANO_REFERENCIA").size().items()}
+                       if "ANO_REFERENCIA" in df.columns else {},
+        "dtypes": df.dtypes.astype(str).to_dict(),
+        "columns": list(df.columns),
+    }
+    with open(out_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
 
     should_write_csv = (
         (write_csv is True) or
@@ -659,10 +928,12 @@ def save_preprocessed(
     out_csv = ""
     if should_write_csv:
         out_csv = f"{base}.csv"
-        df.to_csv(out_csv, index=False, encoding="utf-8")
+        # writer C++ do pyarrow (vetorizado, em blocos) em vez do to_csv célula a célula
+        pacsv.write_csv(_csv_table(table, df), out_csv)
 
-    get_logger().info("save_preprocessed | parquet=%s | csv=%s | shape=%s", out_parquet, out_csv, df.shape)
-    return {"parquet": out_parquet, "csv": out_csv}
+    get_logger().info("save_preprocessed | parquet=%s | csv=%s | meta=%s | shape=%s",
+                      out_parquet, out_csv, out_meta, df.shape)
+    return {"parquet": out_parquet, "csv": out_csv, "meta": out_meta}
 
 
 
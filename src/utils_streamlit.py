@@ -2,25 +2,42 @@
 from __future__ import annotations
 
 import os
+import re
+import functools
+import json
+import weakref
 import yaml
 from typing import Dict, List, Optional, Tuple, Literal
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import queue
+import atexit
 from pathlib import Path
 
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from pandas.api.types import is_numeric_dtype
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import streamlit as st
+from pandas.api.types import is_float_dtype, is_integer_dtype, is_numeric_dtype
 
 
 # =============================
 # Seção 0 - Config e Paths
 # =============================
 
+@functools.lru_cache(maxsize=1)
 def load_config() -> Tuple[Dict[str, str], dict]:
     """
     Carrega config.yaml do diretório raiz e resolve caminhos relativos.
+    Memoizado por processo: reruns não reparseiam o YAML nem repetem o makedirs.
+    Os dicts retornados são compartilhados; não alterar in-place.
     Espera em config['paths'] as chaves: data_raw, data_processed, images, report, addons.
     Adiciona:
       - data_preprocessed: pasta de saídas consolidadas (parquet/csv final)
@@ -53,9 +70,10 @@ def ensure_dir(path: str) -> None:
 # =============================
 
 _LOGGER: Optional[logging.Logger] = None
+_LISTENER: Optional[QueueListener] = None
 
 def get_logger() -> logging.Logger:
-    global _LOGGER
+    global _LOGGER, _LISTENER
     if _LOGGER is not None:
         return _LOGGER
 
@@ -73,7 +91,13 @@ def get_logger() -> logging.Logger:
     fh = RotatingFileHandler(log_path, maxBytes=1_000_000, backupCount=5, encoding="utf-8")
     fmt = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
     fh.setFormatter(fmt)
-    logger.addHandler(fh)
+
+    # a escrita em disco roda numa thread própria: quem loga só enfileira o record
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(q))
+    _LISTENER = QueueListener(q, fh, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)  # esvazia a fila ao sair do processo
     logger.propagate = False
     logger.info("logger_initialized | path=%s", log_path)
 
@@ -81,20 +105,47 @@ def get_logger() -> logging.Logger:
     return logger
 
 
+class _ArgsSummary:
+    """
+    Resumo dos argumentos para o log (DataFrames viram shape + primeiras colunas).
+    Só é montado quando o logging formata a mensagem (%s chama __str__).
+    """
+    __slots__ = ("args", "kwargs")
+
+    def __init__(self, args: tuple, kwargs: dict):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return _describe_args(self.args, self.kwargs)
+
+
+def _describe_args(args: tuple, kwargs: dict) -> str:
+    parts = []
+    for i, a in enumerate(args):
+        if isinstance(a, pd.DataFrame):
+            parts.append(f"arg_df[{i}] shape={a.shape} cols={list(a.columns)[:10]}")
+    for k, v in kwargs.items():
+        if isinstance(v, pd.DataFrame):
+            parts.append(f"kw_df[{k}] shape={v.shape} cols={list(v.columns)[:10]}")
+        else:
+            parts.append(f"{k}={v}")
+    return "; ".join(parts)
+
+
 def log_call(fn):
     """Decorator simples para logar entrada/saída das funções utilitárias."""
+    lg: Optional[logging.Logger] = None
+    @functools.wraps(fn)
     def wrapper(*args, **kwargs):
-        lg = get_logger()
+        nonlocal lg
+        if lg is None:
+            lg = get_logger()  # resolvido uma vez por função decorada
         try:
-            lg.info("call_start | fn=%s", fn.__name__)
-            for i, a in enumerate(args):
-                if isinstance(a, pd.DataFrame):
-                    lg.info("arg_df | idx=%d | shape=%s | cols=%s", i, a.shape, list(a.columns)[:10])
-            for k, v in kwargs.items():
-                if isinstance(v, pd.DataFrame):
-                    lg.info("kw_df | key=%s | shape=%s | cols=%s", k, v.shape, list(v.columns)[:10])
-                else:
-                    lg.info("kw | %s=%s", k, v)
+            if not lg.isEnabledFor(logging.INFO):
+                # acima de INFO: sem introspecção dos args, só o log de erro
+                return fn(*args, **kwargs)
+            lg.info("call_start | fn=%s | args=%s", fn.__name__, _ArgsSummary(args, kwargs))
 
             out = fn(*args, **kwargs)
 
@@ -109,14 +160,193 @@ def log_call(fn):
     return wrapper
 
 
+# =============================
+# Cache de agregações (Streamlit)
+# =============================
+
+# dataset_id -> df carregado; só o objeto exato devolvido pelo loader usa o cache
+# (df.attrs é herdado por recortes, então o id sozinho não basta)
+_DATASETS: "weakref.WeakValueDictionary[str, pd.DataFrame]" = weakref.WeakValueDictionary()
+
+def _register_dataset(df: pd.DataFrame, dataset_id: str) -> None:
+    df.attrs["dataset_id"] = dataset_id
+    _DATASETS[dataset_id] = df
+
+def _dataset_id(df: pd.DataFrame) -> Optional[str]:
+    key = df.attrs.get("dataset_id")
+    return key if key is not None and _DATASETS.get(key) is df else None
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _cached_agg_call(fn_name: str, dataset_id: str, _fn, _df: pd.DataFrame, *args, **kwargs):
+    # _fn/_df não entram no hash; a chave é (fn_name, dataset_id, args, kwargs)
+    return _fn(_df, *args, **kwargs)
+
+
+def st_cache_agg(fn):
+    """
+    Memoiza agregações sobre o df carregado em st.cache_data.
+    Os resultados são pequenos (dezenas de linhas), então o custo de memória é desprezível.
+    Para qualquer outro df (recortes, dfs montados à mão) chama a função direto.
+    """
+    @functools.wraps(fn)
+    def wrapper(df: pd.DataFrame, *args, **kwargs):
+        dataset_id = _dataset_id(df)
+        if dataset_id is None:
+            return fn(df, *args, **kwargs)
+        return _cached_agg_call(fn.__name__, dataset_id, fn, df, *args, **kwargs)
+    return wrapper
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _cached_fig_json(fn_name: str, _fn, df_agg: pd.DataFrame, *args, **kwargs) -> str:
+    # df_agg entra no hash (agregados pequenos: dezenas de linhas); guarda o JSON da figura
+    return _fn(df_agg, *args, **kwargs).to_json()
+
+
+def st_cache_fig(fn):
+    """
+    Memoiza a figura Plotly de um agregado pequeno: a chave é o conteúdo do df + args,
+    e o rerun só desserializa o JSON em vez de refazer o px.* inteiro.
+    Não usar nos boxplots: com centenas de milhares de pontos o JSON custa mais que o px.
+    """
+    @functools.wraps(fn)
+    def wrapper(df_agg: pd.DataFrame, *args, **kwargs):
+        return pio.from_json(_cached_fig_json(fn.__name__, fn, df_agg, *args, **kwargs))
+    return wrapper
+
+
 # ==========================================
 # Seção 1 - I/O para o Streamlit (carregar df final)
 # ==========================================
 
+# Chaves de groupby/filtro de baixa cardinalidade: viram category no load
+CAT_COLS = [
+    "REGIAO",  # fallback de agg_total_invest_by_region em bases sem REGIAO_DESTINO
+    "REGIAO_DESTINO",
+    "SIGLA_UF_DESTINO",
+    "SIGLA_UF_ORIGEM",
+    "GRANDE_AREA",
+    "AREA",
+    "SUBAREA",
+    "MODALIDADE",
+]
+
+# Mesmo dtype de string da pipeline (utils.STRING_DTYPE): StringDtype com backend Arrow
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+# Strings do Arrow ficam em buffers Arrow (string[pyarrow]) em vez de virar objetos str do Python
+_ARROW_TYPES_MAPPER = {
+    pa.string(): STRING_DTYPE,
+    pa.large_string(): STRING_DTYPE,
+}.get
+
+def _prepare_loaded_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajustes de tipo feitos uma única vez, logo após a leitura (o df fica em cache):
+      - CAT_COLS -> category: groupby/unique passam a operar sobre códigos inteiros.
+      - ANO_REFERENCIA -> Int16: a coerção numérica sai dos reruns.
+      - VALOR_PAGO não numérico (ex.: CSV antigo) -> to_numeric aqui, uma vez só;
+        _ensure_numeric_valor nas agregações vira só a checagem de dtype.
+      - VALOR_PAGO inteiro (reais) -> Int32 quando cabe: metade dos bytes nas agregações,
+        sem perda (float32 arredondaria valores acima de 2^24). As somas do pandas saem em Int64.
+        Float com só valores inteiros (NaN no CSV) entra no mesmo caminho; com centavos fica float64.
+      - df.attrs["uf_coverage"]: nº de UFs preenchidas por coluna (DESTINO/ORIGEM).
+      - SIGLA_UF_* -> _normalize_uf (já sai category): a média por UF não limpa de novo.
+    """
+    if "ANO_REFERENCIA" in df.columns and df["ANO_REFERENCIA"].dtype != "Int16":
+        df["ANO_REFERENCIA"] = pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").astype("Int16")
+    if "VALOR_PAGO" in df.columns and not is_numeric_dtype(df["VALOR_PAGO"]):
+        df["VALOR_PAGO"] = _to_numeric(df["VALOR_PAGO"])
+    if "VALOR_PAGO" in df.columns and is_float_dtype(df["VALOR_PAGO"]):
+        # float só por causa dos NaN (CSV): reais inteiros seguem para o Int32 abaixo
+        vals = df["VALOR_PAGO"].to_numpy(dtype="float64", na_value=np.nan)
+        vals = vals[~np.isnan(vals)]
+        if len(vals) and np.isfinite(vals).all() and (vals == np.round(vals)).all():
+            df["VALOR_PAGO"] = df["VALOR_PAGO"].astype("Int64")
+    if "VALOR_PAGO" in df.columns and is_integer_dtype(df["VALOR_PAGO"]):
+        v = df["VALOR_PAGO"]
+        info = np.iinfo(np.int32)
+        if v.notna().any() and info.min <= v.min() and v.max() <= info.max:
+            df["VALOR_PAGO"] = v.astype("Int32")
+    # cobertura das colunas de UF (não nulos), usada pela escolha automática em _choose_uf_column
+    df.attrs["uf_coverage"] = {
+        side: int(df[f"SIGLA_UF_{side}"].count())
+        for side in ("DESTINO", "ORIGEM") if f"SIGLA_UF_{side}" in df.columns
+    }
+    for c in ("SIGLA_UF_DESTINO", "SIGLA_UF_ORIGEM"):
+        if c in df.columns:
+            df[c] = _normalize_uf(df[c])
+    for c in CAT_COLS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype("category")
+    return df
+
+
+def _ensure_arrow_cache(pq_path: Path) -> Path:
+    """
+    Mantém um espelho Arrow IPC (feather, sem compressão) do parquet consolidado,
+    ao lado dele. Regrava quando o parquet for mais novo que o .arrow.
+    """
+    arrow_path = pq_path.with_suffix(".arrow")
+    if arrow_path.exists() and arrow_path.stat().st_mtime >= pq_path.stat().st_mtime:
+        return arrow_path
+    try:
+        table = pq.read_table(pq_path)
+        feather.write_feather(table, str(arrow_path), compression="uncompressed")
+        get_logger().info("arrow_cache_written | path=%s | rows=%d", arrow_path, table.num_rows)
+        return arrow_path
+    except OSError as e:
+        # pasta somente leitura etc.: segue lendo o parquet direto
+        get_logger().warning("arrow_cache_failed | path=%s | err=%s", arrow_path, e)
+        return pq_path
+
+
+@st.cache_resource(show_spinner=False)
+def _load_preprocessed_cached(path: str, mtime: float, year: Optional[int] = None,
+                              columns: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """
+    Lê o dataset uma única vez por processo; reruns e sessões compartilham o mesmo df.
+    A chave (path, mtime, year, columns) invalida o cache quando o arquivo é regravado.
+    O df é compartilhado: os helpers não devem alterá-lo in-place.
+    """
+    lg = get_logger()
+    src = Path(path)
+    cols = list(columns) if columns is not None else None
+    if src.suffix == ".arrow":
+        table = feather.read_table(path, columns=cols, memory_map=True)
+        df = table.to_pandas(split_blocks=True, self_destruct=True, types_mapper=_ARROW_TYPES_MAPPER)
+    elif src.suffix == ".parquet":
+        # filtro empurrado para o leitor: row groups de outros anos nem são lidos
+        filters = [("ANO_REFERENCIA", "=", year)] if year is not None else None
+        df = pq.read_table(src, columns=cols, filters=filters).to_pandas(types_mapper=_ARROW_TYPES_MAPPER)
+    else:
+        df = pd.read_csv(
+            src,
+            usecols=cols,
+            dtype={
+                "ANO_REFERENCIA": "Int64",
+                "PROCESSO": STRING_DTYPE,
+                "CPF_HASH": STRING_DTYPE,
+            }
+        )
+        if year is not None:
+            df = df[df["ANO_REFERENCIA"] == year].reset_index(drop=True)
+    df = _prepare_loaded_dataset(df)
+    _register_dataset(df, f"{path}|{mtime}|{year}|{columns}")
+    lg.info("loaded_df | src=%s | mtime=%s | year=%s | shape=%s | cols=%s",
+            path, mtime, year, df.shape, list(df.columns))
+    return df
+
+
 @log_call
-def load_preprocessed_dataset(paths: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+def load_preprocessed_dataset(paths: Optional[Dict[str, str]] = None, year: Optional[int] = None,
+                              columns: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Carrega o dataset consolidado de data/preprocessed/cnpq_pagamentos_2022_2024.(parquet|csv).
+    O parquet é espelhado em .arrow (mmap) e o df resultante fica em st.cache_resource.
+    Com year/columns, lê direto do parquet com filtro e projeção no leitor
+    (só os row groups do ano e só as colunas pedidas são decodificados).
     """
     if paths is None:
         paths, _ = load_config()
@@ -127,22 +357,13 @@ def load_preprocessed_dataset(paths: Optional[Dict[str, str]] = None) -> pd.Data
     lg = get_logger()
     lg.info("load_preprocessed | pq=%s | csv=%s", pq_path, csv_path)
 
+    cols = tuple(columns) if columns is not None else None
     if pq_path.exists():
-        df = pd.read_parquet(pq_path)
-        lg.info("loaded_df | shape=%s | cols=%s", df.shape, list(df.columns))
-        return df
+        src = _ensure_arrow_cache(pq_path) if year is None else pq_path
+        return _load_preprocessed_cached(str(src), src.stat().st_mtime, year, cols)
 
     if csv_path.exists():
-        df = pd.read_csv(
-            csv_path,
-            dtype={
-                "ANO_REFERENCIA": "Int64",
-                "PROCESSO": "string",
-                "CPF_HASH": "string",
-            }
-        )
-        lg.info("loaded_df_csv | shape=%s | cols=%s", df.shape, list(df.columns))
-        return df
+        return _load_preprocessed_cached(str(csv_path), csv_path.stat().st_mtime, year, cols)
 
     lg.error("file_not_found | pq=%s | csv=%s", pq_path, csv_path)
     raise FileNotFoundError(
@@ -151,6 +372,45 @@ def load_preprocessed_dataset(paths: Optional[Dict[str, str]] = None) -> pd.Data
     )
 
 
+@st.cache_data(show_spinner=False)
+def _read_meta_cached(path: str, mtime: float) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@log_call
+def load_dataset_meta(paths: Optional[Dict[str, str]] = None) -> Optional[dict]:
+    """
+    Lê o sidecar cnpq_pagamentos_2022_2024_meta.json gravado pela pipeline
+    (linhas por ano, dtypes, colunas). Retorna None se não existir ou se for
+    mais antigo que o parquet (dataset regravado sem o sidecar).
+    """
+    if paths is None:
+        paths, _ = load_config()
+    base = Path(paths["data_preprocessed"]) / "cnpq_pagamentos_2022_2024"
+    meta_path = base.parent / f"{base.name}_meta.json"
+    pq_path = base.with_suffix(".parquet")
+    if not meta_path.exists():
+        return None
+    mtime = meta_path.stat().st_mtime
+    if pq_path.exists() and pq_path.stat().st_mtime > mtime:
+        get_logger().warning("meta_stale | meta=%s | pq=%s", meta_path, pq_path)
+        return None
+    return _read_meta_cached(str(meta_path), mtime)
+
+
+def _years(df: pd.DataFrame) -> List[int]:
+    """Anos distintos (ordenados) de ANO_REFERENCIA; sem to_numeric quando a coluna já é inteira."""
+    col = df["ANO_REFERENCIA"]
+    if is_integer_dtype(col):
+        # já é inteiro (Int16 no load): um único unique sobre os valores válidos
+        anos = np.unique(col.dropna().to_numpy())
+    else:
+        anos = pd.to_numeric(col, errors="coerce").dropna().astype(int).unique()
+    return sorted(int(a) for a in anos)
+
+
+@st_cache_agg
 @log_call
 def get_dataset_notes(df: pd.DataFrame) -> List[str]:
     notes: List[str] = []
@@ -163,8 +423,7 @@ def get_dataset_notes(df: pd.DataFrame) -> List[str]:
     if "ANO_REFERENCIA" not in df.columns:
         notes.append("Coluna 'ANO_REFERENCIA' ausente no dataset.")
     else:
-        anos = pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").dropna().astype(int).unique()
-        if len(anos) == 0:
+        if len(_years(df)) == 0:
             notes.append("Nenhum 'ANO_REFERENCIA' válido encontrado.")
 
     # Regiões / UFs
@@ -174,12 +433,12 @@ def get_dataset_notes(df: pd.DataFrame) -> List[str]:
     return notes
 
 
+@st_cache_agg
 @log_call
 def list_available_years(df: pd.DataFrame) -> List[int]:
     if "ANO_REFERENCIA" not in df.columns:
         return []
-    anos = pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").dropna().astype(int).unique()
-    years = sorted(anos.tolist())
+    years = _years(df)
     get_logger().info("years_available | %s", years)
     return years
 
@@ -188,132 +447,440 @@ def list_available_years(df: pd.DataFrame) -> List[int]:
 # Seção 2 - Helpers de tipagem/filtragem
 # ==========================================
 
+# nomes de beneficiários ocultados na base (menores de idade): fora da média por beneficiário
+CENSORED_NAMES = ("XXXX", "XXX XXX XXX")
+
+# teto de pontos por grupo nos dados de boxplot: acima disso os quartis de uma amostra
+# já coincidem na prática e o JSON do px.box cresce com cada linha
+BOX_MAX_PER_GROUP = 50_000
+
+def _to_numeric(s: pd.Series) -> pd.Series:
+    """
+    pd.to_numeric(errors="coerce") para a coluna de texto, tentando antes o cast do
+    pyarrow.compute (C++, sem parse por objeto str). Vazios viram nulos; se algum valor
+    não for número o cast recusa e o to_numeric do pandas decide (inválido -> NaN).
+    """
+    try:
+        arr = pc.utf8_trim_whitespace(pa.array(s.astype(STRING_DTYPE)))
+        arr = pc.if_else(pc.equal(arr, ""), pa.scalar(None, pa.string()), arr)
+        out = pc.cast(arr, pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return pd.to_numeric(s, errors="coerce")
+    return pd.Series(out.to_numpy(zero_copy_only=False), index=s.index, name=s.name)
+
 def _ensure_numeric_valor(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    if not is_numeric_dtype(df.get("VALOR_PAGO", pd.Series([], dtype=float))):
-        df["VALOR_PAGO"] = pd.to_numeric(df["VALOR_PAGO"], errors="coerce")
+    # o load já deixa VALOR_PAGO numérico; a conversão aqui só cobre df vindo de fora do loader
+    if "VALOR_PAGO" in df.columns and not is_numeric_dtype(df["VALOR_PAGO"]):
+        return df.assign(VALOR_PAGO=_to_numeric(df["VALOR_PAGO"]))
     return df
 
-def _filter_year(df: pd.DataFrame, year: Optional[int]) -> pd.DataFrame:
+def _year_mask(df: pd.DataFrame, year: int) -> pd.Series:
+    if is_integer_dtype(df["ANO_REFERENCIA"]):
+        return df["ANO_REFERENCIA"] == year
+    return pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").astype("Int64") == year
+
+# dataset_id -> {ano: posições das linhas}; fora de df.attrs porque attrs é copiado em cada recorte
+_YEAR_ROWS: Dict[str, Dict[int, np.ndarray]] = {}
+
+def _year_rows(df: pd.DataFrame, year: int) -> Optional[np.ndarray]:
+    """
+    Posições (crescentes) das linhas do ano no df carregado, particionadas uma vez por
+    dataset: as chamadas seguintes viram um lookup no dict em vez de uma máscara por agregação.
+    None para recortes/dfs de fora do loader (aí vale a máscara de _year_mask).
+    """
+    dataset_id = _dataset_id(df)
+    if dataset_id is None or not is_integer_dtype(df["ANO_REFERENCIA"]):
+        return None
+    rows = _YEAR_ROWS.get(dataset_id)
+    if rows is None:
+        codes, years = pd.factorize(df["ANO_REFERENCIA"], sort=True)
+        order = np.argsort(codes, kind="stable")  # NA (-1) primeiro, depois ano a ano
+        bounds = np.searchsorted(codes[order], np.arange(len(years) + 1))
+        rows = {int(y): order[bounds[i]:bounds[i + 1]] for i, y in enumerate(years)}
+        # list(): cópia das chaves numa chamada só; as sessões do Streamlit rodam em threads
+        for stale in [k for k in list(_YEAR_ROWS) if k not in _DATASETS]:
+            _YEAR_ROWS.pop(stale, None)
+        _YEAR_ROWS[dataset_id] = rows
+    return rows.get(int(year), np.empty(0, dtype=np.intp))
+
+def _project(df: pd.DataFrame, cols: List[str], year: Optional[int] = None) -> pd.DataFrame:
+    """
+    Projeção + filtro antes de qualquer cópia: materializa só as colunas usadas
+    pela agregação e só as linhas do ano pedido; o groupby roda sobre esse recorte.
+    Colunas ausentes são ignoradas (cada agregação valida as suas).
+    """
+    keep = [c for c in dict.fromkeys(cols) if c in df.columns]
     if year is None:
+        out = df[keep]
+    else:
+        rows = _year_rows(df, year)
+        out = (df.loc[_year_mask(df, year), keep] if rows is None
+               else df.iloc[rows, df.columns.get_indexer(keep)])
+    return _ensure_numeric_valor(out)
+
+
+def _bincount_agg(codes: np.ndarray, values: np.ndarray, n_groups: int,
+                  counts: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Soma de values e nº de linhas por grupo (codes em [0, n_groups)): dois np.bincount,
+    acesso direto por índice, sem tabela de hash. counts: quantas linhas cada posição
+    representa (linhas pré-agregadas); None = uma cada.
+    """
+    # entrada vazia: o bincount devolve int64 mesmo com weights float
+    sums = np.bincount(codes, weights=values, minlength=n_groups).astype(np.float64, copy=False)
+    if counts is None:
+        return sums, np.bincount(codes, minlength=n_groups)
+    return sums, np.bincount(codes, weights=counts, minlength=n_groups).astype(np.int64)
+
+def _group_sum_nunique(codes: np.ndarray, values: np.ndarray, ids: np.ndarray,
+                       n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Soma de values e nº de ids distintos por grupo, vetorizado sobre códigos inteiros
+    (codes em [0, n_groups), ids >= 0, values sem NaN): bincount para a soma e
+    pares (grupo, id) distintos para o nunique, numa passada só por grupo.
+    O bincount não precisa dos pares ordenados: pd.unique (hash de int64, O(N))
+    no lugar do np.unique, que ordenava tudo.
+    """
+    # entrada vazia: o bincount devolve int64 mesmo com weights float
+    sums = np.bincount(codes, weights=values, minlength=n_groups).astype(np.float64, copy=False)
+    n_ids = int(ids.max()) + 1 if len(ids) else 1
+    pairs = pd.unique(codes.astype(np.int64) * n_ids + ids)
+    nunique = np.bincount(pairs // n_ids, minlength=n_groups)
+    return sums, nunique
+
+def _sum_size_by(df: pd.DataFrame, col: str, sum_name: str, size_name: str,
+                 size_col: Optional[str] = None) -> pd.DataFrame:
+    """
+    Soma de VALOR_PAGO e nº de linhas por col (NA em col fica de fora) em uma passada
+    de np.bincount sobre os códigos da categoria, no lugar do groupby com hash.
+    Mesma saída de groupby(col, as_index=False, observed=True).agg(sum, size).
+    size_col: coluna com o nº de linhas que cada linha já representa (cubo de _summary_cube);
+    None = uma linha cada.
+    """
+    keys = df[col].astype("category")
+    codes = keys.cat.codes.to_numpy()
+    values = df["VALOR_PAGO"].to_numpy(dtype="float64", na_value=0.0)
+    n_groups = len(keys.cat.categories)
+    has_key = codes >= 0
+
+    counts = None if size_col is None else df[size_col].to_numpy(dtype="float64")[has_key]
+    sums, sizes = _bincount_agg(codes[has_key], values[has_key], n_groups, counts)
+    keep = np.flatnonzero(sizes)
+    return pd.DataFrame({
+        col: pd.Categorical.from_codes(keep, dtype=keys.dtype),
+        sum_name: sums[keep],
+        size_name: sizes[keep],
+    })
+
+# chaves do cubo de somas: as colunas por onde região/área/modalidade agregam
+SUMMARY_KEYS = ["ANO_REFERENCIA", "REGIAO_DESTINO", "GRANDE_AREA", "AREA", "SUBAREA", "MODALIDADE"]
+
+# dataset_id -> cubo (uma linha por combinação de SUMMARY_KEYS), como em _YEAR_ROWS
+_SUMMARIES: Dict[str, pd.DataFrame] = {}
+
+def _summary_cube(df: pd.DataFrame, col: str) -> Optional[pd.DataFrame]:
+    """
+    Soma de VALOR_PAGO e nº de linhas por combinação de SUMMARY_KEYS (NA vira grupo próprio),
+    calculado uma vez por dataset carregado: ~40 mil linhas no lugar de ~600 mil, e as
+    agregações de soma por região/área/modalidade passam a ler o cubo.
+    col: chave pedida pelo chamador; sem ela (ou sem ANO_REFERENCIA/VALOR_PAGO) no df o cubo
+    não serve e nem é montado. None para recortes/dfs de fora do loader.
+    """
+    dataset_id = _dataset_id(df)
+    needed = ("ANO_REFERENCIA", col, "VALOR_PAGO")
+    if (dataset_id is None or col not in SUMMARY_KEYS
+            or any(c not in df.columns for c in needed)
+            or not is_integer_dtype(df["ANO_REFERENCIA"])):
+        return None
+    cube = _SUMMARIES.get(dataset_id)
+    if cube is None:
+        keys = [c for c in SUMMARY_KEYS if c in df.columns]
+        cube = (_ensure_numeric_valor(df)
+                .groupby(keys, observed=True, dropna=False, sort=False)
+                .agg(VALOR_PAGO=("VALOR_PAGO", "sum"), n=("VALOR_PAGO", "size"))
+                .reset_index())
+        # list(): cópia das chaves numa chamada só; as sessões do Streamlit rodam em threads
+        for stale in [k for k in list(_SUMMARIES) if k not in _DATASETS]:
+            _SUMMARIES.pop(stale, None)
+        _SUMMARIES[dataset_id] = cube
+        get_logger().info("summary_cube | rows=%d | groups=%d", len(df), len(cube))
+    return cube
+
+def _sum_size_source(df: pd.DataFrame, col: str, year: Optional[int]) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Entrada de _sum_size_by para agregar por col: o cubo (recortado no ano) quando col
+    faz parte dele, senão a projeção das linhas. Retorna (frame, size_col).
+    """
+    cube = _summary_cube(df, col)
+    if cube is not None:
+        return (cube if year is None else cube[cube["ANO_REFERENCIA"] == year]), "n"
+    return _project(df, [col, "VALOR_PAGO"], year), None
+
+
+def _entity_codes(s: pd.Series, exclude: Tuple[str, ...] = ()) -> np.ndarray:
+    """
+    Códigos inteiros (factorize) da entidade; -1 para NA e para os valores em exclude.
+    O teste de exclusão roda sobre os valores distintos e vira um np.isin de inteiros
+    nas linhas, sem isin de strings por linha.
+    """
+    codes, uniques = pd.factorize(s)
+    if exclude:
+        drop = np.flatnonzero(pd.Index(uniques).isin(exclude))
+        if len(drop):
+            codes = np.where(np.isin(codes, drop), -1, codes)
+    return codes
+
+def _mean_per_entity(df: pd.DataFrame, id_col: str, exclude: Tuple[str, ...] = ()) -> pd.DataFrame:
+    """
+    Média por MODALIDADE do total por entidade (beneficiário/processo):
+    soma do grupo / nº de entidades distintas no grupo. Linhas com NA em MODALIDADE/id_col
+    ou com id em exclude ficam de fora.
+    Retorna: ['MODALIDADE','valor_em_reais','n_unicos'].
+    """
+    mod = df["MODALIDADE"].astype("category")
+    codes = mod.cat.codes.to_numpy()
+    ids = _entity_codes(df[id_col], exclude)
+    values = df["VALOR_PAGO"].to_numpy(dtype="float64", na_value=0.0)
+    keep = (codes >= 0) & (ids >= 0)
+    codes, ids, values = codes[keep], ids[keep], values[keep]
+
+    sums, nunique = _group_sum_nunique(codes, values, ids, len(mod.cat.categories))
+    keep = nunique > 0
+    return pd.DataFrame({
+        "MODALIDADE": mod.cat.categories[keep],
+        "valor_em_reais": sums[keep] / nunique[keep],
+        "n_unicos": nunique[keep],
+    })
+
+
+def _box_summary(df_box: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """
+    Resumo de boxplot de VALOR_PAGO por grupo, com as mesmas regras do px.box:
+    quartis lineares e cercas no ponto mais extremo dentro de 1.5 * IQR.
+    Retorna: [*keys, 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'n'].
+    """
+    if df_box.empty:
+        # ano/filtro sem linhas: schema vazio direto (o quantile/unstack sobre zero grupos quebra)
+        cols = {k: df_box[k].iloc[:0].reset_index(drop=True) for k in keys}
+        cols.update({c: pd.Series(dtype="float64") for c in ("q1", "median", "q3", "lowerfence", "upperfence")})
+        cols["n"] = pd.Series(dtype="int64")
+        return pd.DataFrame(cols)
+    gb = df_box.groupby(keys, observed=True)
+    q = gb["VALOR_PAGO"].quantile([0.25, 0.5, 0.75]).unstack()
+    q1, q3 = q[0.25].to_numpy(dtype="float64"), q[0.75].to_numpy(dtype="float64")
+
+    # cercas: extremos dos pontos dentro de [q1 - 1.5 IQR, q3 + 1.5 IQR] do próprio grupo
+    codes = gb.ngroup().to_numpy()
+    values = df_box["VALOR_PAGO"].to_numpy(dtype="float64", na_value=np.nan)
+    iqr = q3 - q1
+    inside = (values >= (q1 - 1.5 * iqr)[codes]) & (values <= (q3 + 1.5 * iqr)[codes])
+    fences = (pd.Series(values[inside]).groupby(codes[inside], sort=False)
+                .agg(["min", "max"]).reindex(range(len(q))))
+
+    out = q.index.to_frame(index=False)
+    out["q1"] = q1
+    out["median"] = q[0.5].to_numpy(dtype="float64")
+    out["q3"] = q3
+    out["lowerfence"] = fences["min"].to_numpy()
+    out["upperfence"] = fences["max"].to_numpy()
+    out["n"] = gb.size().to_numpy()
+    return out
+
+
+def _cap_per_group(df: pd.DataFrame, keys: List[str], max_per_group: Optional[int]) -> pd.DataFrame:
+    """
+    Amostra aleatória (semente fixa) de no máximo max_per_group linhas por grupo, na ordem
+    original. Grupos menores ficam inteiros; None desliga. Sem groupby.apply: permuta as
+    linhas uma vez e corta pelo cumcount de cada grupo na ordem permutada.
+    """
+    if max_per_group is None or len(df) <= max_per_group:
         return df
-    return df[pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").astype("Int64") == year].copy()
+    codes = df.groupby(keys, observed=True, sort=False).ngroup().to_numpy()
+    order = np.random.default_rng(0).permutation(len(df))
+    rank = pd.Series(codes[order]).groupby(codes[order], sort=False).cumcount().to_numpy()
+    rows = np.sort(order[rank < max_per_group])
+    if len(rows) == len(df):
+        return df
+    get_logger().info("box_sample | keys=%s | rows=%d | kept=%d", keys, len(df), len(rows))
+    return df.take(rows)
+
+
+def _rank_desc(out: pd.DataFrame, col: str, top_n: Optional[int] = None) -> pd.DataFrame:
+    """
+    Ordena por col decrescente (estável: empates na ordem dos grupos).
+    Com top_n, fica só com as top_n maiores via nlargest, sem ordenar a cauda.
+    """
+    if top_n is not None:
+        return out.nlargest(top_n, col, keep="first").reset_index(drop=True)
+    return out.sort_values(col, ascending=False, kind="mergesort").reset_index(drop=True)
 
 
 # =========================================================
 # Seção 3 - Agregações (para os gráficos)
 # =========================================================
 
+@functools.lru_cache(maxsize=32)
+def _choose_region_column(columns: Tuple[str, ...], prefer_destino: bool = True) -> str:
+    """
+    Coluna usada como região: REGIAO_DESTINO, senão REGIAO, senão a UF (fallback bruto).
+    Depende só dos nomes das colunas, então fica memoizada por esquema; a escolha é da
+    coluna inteira (um coalesce linha a linha misturaria regiões com siglas de UF).
+    """
+    if "REGIAO_DESTINO" in columns:
+        return "REGIAO_DESTINO"
+    if "REGIAO" in columns:
+        return "REGIAO"
+    # fallback bruto via UF, se não houver região no dataset final
+    if prefer_destino and "SIGLA_UF_DESTINO" in columns:
+        return "SIGLA_UF_DESTINO"
+    if "SIGLA_UF_ORIGEM" in columns:
+        return "SIGLA_UF_ORIGEM"
+    raise ValueError("Sem coluna de região ou UF para agregar por região.")
+
+
+@st_cache_agg
 @log_call
 def agg_total_invest_by_region(df: pd.DataFrame, year: Optional[int] = None,
-                               prefer_destino: bool = True) -> pd.DataFrame:
+                               prefer_destino: bool = True, top_n: Optional[int] = None) -> pd.DataFrame:
     """
     Soma de VALOR_PAGO por REGIÃO (usa REGIAO_DESTINO quando disponível; fallback: REGIAO ou UF).
+    top_n: só as top_n regiões de maior valor_total (None = todas).
     Retorna colunas: ['REGIAO', 'valor_total', 'n_linhas'].
     """
-    df = _ensure_numeric_valor(df)
-    df = _filter_year(df, year)
-
-    if "REGIAO_DESTINO" in df.columns:
-        reg_col = "REGIAO_DESTINO"
-    elif "REGIAO" in df.columns:
-        reg_col = "REGIAO"
-    else:
-        # fallback bruto via UF, se não houver região no dataset final
-        uf_col = "SIGLA_UF_DESTINO" if prefer_destino and ("SIGLA_UF_DESTINO" in df.columns) else \
-                 ("SIGLA_UF_ORIGEM" if "SIGLA_UF_ORIGEM" in df.columns else None)
-        if uf_col is None:
-            raise ValueError("Sem coluna de região ou UF para agregar por região.")
-        reg_col = uf_col  # agrega por UF mesmo
-
-    out = (df.dropna(subset=[reg_col])
-             .groupby(reg_col, as_index=False)
-             .agg(valor_total=("VALOR_PAGO", "sum"),
-                  n_linhas=("VALOR_PAGO", "size"))
+    reg_col = _choose_region_column(tuple(df.columns), prefer_destino)
+    src, size_col = _sum_size_source(df, reg_col, year)
+    out = (_sum_size_by(src, reg_col, "valor_total", "n_linhas", size_col=size_col)
              .rename(columns={reg_col: "REGIAO"}))
-    out["valor_total"] = out["valor_total"].astype(float)
-    return out.sort_values("valor_total", ascending=False, kind="mergesort").reset_index(drop=True)
+    # chave sai como string (category só dentro da agregação), como MODALIDADE
+    out["REGIAO"] = out["REGIAO"].astype(STRING_DTYPE)
+    return _rank_desc(out, "valor_total", top_n)
 
 
+@st_cache_agg
 @log_call
 def agg_total_invest_by_area(df: pd.DataFrame, year: Optional[int] = None,
-                             level: Literal["GRANDE_AREA","AREA","SUBAREA"] = "AREA") -> pd.DataFrame:
+                             level: Literal["GRANDE_AREA","AREA","SUBAREA"] = "AREA",
+                             top_n: Optional[int] = None) -> pd.DataFrame:
     """
     Soma de VALOR_PAGO por área/grande área/subárea.
+    top_n: só as top_n áreas de maior valor_total (None = todas).
     Retorna: [<level>, 'valor_total', 'n_linhas'].
     """
-    df = _ensure_numeric_valor(df)
-    df = _filter_year(df, year)
     col = level
     if col not in df.columns:
         raise ValueError(f"Coluna '{col}' ausente para agregar.")
-
-    out = (df.dropna(subset=[col])
-             .groupby(col, as_index=False)
-             .agg(valor_total=("VALOR_PAGO","sum"),
-                  n_linhas=("VALOR_PAGO","size")))
-    out["valor_total"] = out["valor_total"].astype(float)
-    return out.sort_values("valor_total", ascending=False, kind="mergesort").reset_index(drop=True)
+    src, size_col = _sum_size_source(df, col, year)
+    out = _sum_size_by(src, col, "valor_total", "n_linhas", size_col=size_col)
+    # chave sai como string (category só dentro da agregação), como MODALIDADE
+    out[col] = out[col].astype(STRING_DTYPE)
+    return _rank_desc(out, "valor_total", top_n)
 
 
+@st_cache_agg
 @log_call
 def agg_invest_by_category(df: pd.DataFrame, year: Optional[int] = None,
-                           how: Literal["sum","per_beneficiary_mean","per_process_mean"]="sum") -> pd.DataFrame:
+                           how: Literal["sum","per_beneficiary_mean","per_process_mean"]="sum",
+                           top_n: Optional[int] = None) -> pd.DataFrame:
     """
     Investimento por categoria de bolsa (MODALIDADE).
     - how="sum": soma total (clássico)
     - how="per_beneficiary_mean": média por beneficiário (pondera pela quantidade de bolsistas)
     - how="per_process_mean": média por processo (pondera pela quantidade de processos)
+    - top_n: só as top_n modalidades de maior valor (None = todas)
     Retorna: ['MODALIDADE','valor','n_base'] onde 'valor' é a métrica escolhida.
     """
-    df = _ensure_numeric_valor(df)
-    df = _filter_year(df, year)
-
     if "MODALIDADE" not in df.columns:
         raise ValueError("Coluna 'MODALIDADE' ausente.")
 
     if how == "sum":
-        out = (df.dropna(subset=["MODALIDADE"])
-                 .groupby("MODALIDADE", as_index=False)
-                 .agg(valor_em_reais=("VALOR_PAGO","sum"),
-                      n_unicos=("VALOR_PAGO","size")))
+        src, size_col = _sum_size_source(df, "MODALIDADE", year)
+        out = _sum_size_by(src, "MODALIDADE", "valor_em_reais", "n_unicos", size_col=size_col)
     elif how == "per_beneficiary_mean":
         # média do total por beneficiário, por categoria
         if "BENEFICIARIO" not in df.columns:
             raise ValueError("Métrica 'per_beneficiary_mean' requer 'BENEFICIARIO'.")
-        censored_names = ["XXXX", "XXX XXX XXX"]
-        df_tmp = df[~df["BENEFICIARIO"].isin(censored_names)]
-        tmp = (df_tmp.dropna(subset=["BENEFICIARIO","MODALIDADE"])
-                 .groupby(["MODALIDADE","BENEFICIARIO"], as_index=False)["VALOR_PAGO"].sum())
-        out = (tmp.groupby("MODALIDADE", as_index=False)
-                 .agg(valor_em_reais=("VALOR_PAGO","mean"),
-                      n_unicos=("BENEFICIARIO","nunique")))
+        df = _project(df, ["MODALIDADE", "VALOR_PAGO", "BENEFICIARIO"], year)
+        out = _mean_per_entity(df, "BENEFICIARIO", exclude=CENSORED_NAMES)
     else:  # per_process_mean
         if "PROCESSO" not in df.columns:
             raise ValueError("Métrica 'per_process_mean' requer 'PROCESSO'.")
-        tmp = (df.dropna(subset=["PROCESSO","MODALIDADE"])
-                 .groupby(["MODALIDADE","PROCESSO"], as_index=False)["VALOR_PAGO"].sum())
-        out = (tmp.groupby("MODALIDADE", as_index=False)
-                 .agg(valor_em_reais=("VALOR_PAGO","mean"),
-                      n_unicos=("PROCESSO","nunique")))
+        df = _project(df, ["MODALIDADE", "VALOR_PAGO", "PROCESSO"], year)
+        out = _mean_per_entity(df, "PROCESSO")
 
-    out["valor_em_reais"] = out["valor_em_reais"].astype(float)
-    return out.sort_values("valor_em_reais", ascending=False, kind="mergesort").reset_index(drop=True)
+    # category (cubo) ou categorias do factorize: a saída sai sempre como string
+    out["MODALIDADE"] = out["MODALIDADE"].astype(STRING_DTYPE)
+    return _rank_desc(out, "valor_em_reais", top_n)
 
 
+def _category_frame(categories: pd.Index, sums: np.ndarray, counts: np.ndarray,
+                    mean: bool = False) -> pd.DataFrame:
+    """
+    Monta a saída padrão de agg_invest_by_category a partir dos vetores por grupo.
+    mean=True divide a soma pela contagem (média por entidade).
+    """
+    keep = counts > 0
+    valor = sums[keep] / counts[keep] if mean else sums[keep]
+    out = pd.DataFrame({
+        "MODALIDADE": categories[keep].astype(STRING_DTYPE),
+        "valor_em_reais": valor,
+        "n_unicos": counts[keep],
+    })
+    return _rank_desc(out, "valor_em_reais")
+
+
+@st_cache_agg
 @log_call
-def agg_box_data_by_category(df: pd.DataFrame, year: Optional[int] = None, category: Optional[str] = None) -> pd.DataFrame:
+def agg_invest_by_category_all(df: pd.DataFrame, year: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """
+    As três métricas de agg_invest_by_category em uma única passada sobre os dados:
+    projeção, filtro de ano e códigos de MODALIDADE são feitos uma vez só.
+    Retorna: {"sum", "per_beneficiary_mean", "per_process_mean"} -> mesmo formato de
+    agg_invest_by_category(how=...).
+    """
+    df = _project(df, ["MODALIDADE", "VALOR_PAGO", "BENEFICIARIO", "PROCESSO"], year)
+
+    missing = [c for c in ["MODALIDADE", "BENEFICIARIO", "PROCESSO"] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas ausentes: {missing}")
+
+    mod = df["MODALIDADE"].astype("category")
+    codes = mod.cat.codes.to_numpy()
+    values = df["VALOR_PAGO"].to_numpy(dtype="float64", na_value=0.0)
+    n_groups = len(mod.cat.categories)
+    has_mod = codes >= 0
+
+    # soma total e nº de linhas por modalidade
+    sums, sizes = _bincount_agg(codes[has_mod], values[has_mod], n_groups)
+    out = {"sum": _category_frame(mod.cat.categories, sums, sizes)}
+
+    # médias por entidade: mesmos códigos de modalidade, ids diferentes (-1 = fora)
+    entities = {
+        "per_beneficiary_mean": _entity_codes(df["BENEFICIARIO"], CENSORED_NAMES),
+        "per_process_mean": _entity_codes(df["PROCESSO"]),
+    }
+    for how, ids in entities.items():
+        mask = (ids >= 0) & has_mod
+        g_sums, g_nunique = _group_sum_nunique(codes[mask], values[mask], ids[mask], n_groups)
+        out[how] = _category_frame(mod.cat.categories, g_sums, g_nunique, mean=True)
+    return out
+
+
+@log_call
+def agg_box_data_by_category(df: pd.DataFrame, year: Optional[int] = None, category: Optional[str] = None,
+                             max_per_group: Optional[int] = BOX_MAX_PER_GROUP) -> pd.DataFrame:
     """
     Retorna dados prontos para boxplot: VALOR_PAGO x MODALIDADE (com filtro de ano).
+    max_per_group: teto de pontos por modalidade (amostra fixa; None = todos).
     """
-    df = _ensure_numeric_valor(df)
-    df = _filter_year(df, year)
+    selected_cols = ["ANO_REFERENCIA", "PROCESSO", "MODALIDADE", "VALOR_PAGO"]
+    df = _project(df, selected_cols, year)
 
     if category is not None:
         df = df[df["MODALIDADE"] == category]
 
-    selected_cols = ["ANO_REFERENCIA", "PROCESSO", "MODALIDADE", "VALOR_PAGO"]
-    df_clean = df[selected_cols].dropna(subset=["VALOR_PAGO","MODALIDADE"]).copy()
+    # _project já devolve um recorte próprio: sem df[cols] nem .copy() extras (o px.box não altera o df)
+    df_clean = df.dropna(subset=["VALOR_PAGO","MODALIDADE"])
+    df_clean = _cap_per_group(df_clean, ["MODALIDADE"], max_per_group)
     # df_avg = df_clean.groupby("MODALIDADE", as_index=False).agg({"VALOR_PAGO" : "mean"})
     # df_avg.rename(columns={"VALOR_PAGO":"VALOR_MEDIO"}, inplace=True)
 
@@ -326,22 +893,24 @@ def agg_box_data_by_area(
         df: pd.DataFrame,
         year: Optional[int] = None, 
         level: Literal["GRANDE_AREA","AREA","SUBAREA"]="AREA",
-        level_val : Optional[str] = None
+        level_val : Optional[str] = None,
+        max_per_group: Optional[int] = BOX_MAX_PER_GROUP
     ) -> pd.DataFrame:
     """
     Dados para boxplot: VALOR_PAGO x área/subárea/grande área.
+    max_per_group: teto de pontos por área (amostra fixa; None = todos).
     """
-    df = _ensure_numeric_valor(df)
-    df = _filter_year(df, year)
-
     if level not in df.columns:
         raise ValueError(f"Coluna '{level}' ausente.")
-    
+
+    selected_columns = ["ANO_REFERENCIA", "PROCESSO", level, "VALOR_PAGO"]
+    df = _project(df, selected_columns, year)
+
     if level_val is not None:
         df = df[df[level] == level_val]
     
-    selected_columns = ["ANO_REFERENCIA", "PROCESSO", level, "VALOR_PAGO"]
-    df_clean = df[selected_columns].dropna(subset=["VALOR_PAGO", level]).copy()
+    df_clean = df.dropna(subset=["VALOR_PAGO", level])
+    df_clean = _cap_per_group(df_clean, [level], max_per_group)
     # df_avg = df_clean.groupby(level, as_index=False).agg({"VALOR_PAGO" : "mean"})
     # df_avg.rename(columns={"VALOR_PAGO":"VALOR_MEDIO"}, inplace=True)
 
@@ -354,19 +923,22 @@ def agg_box_data_by_area_and_category(
         year: Optional[int] = None,
         level: Literal["GRANDE_AREA","AREA","SUBAREA"]="AREA",
         level_val : Optional[str] = None,
-        category : Optional[str] = None
+        category : Optional[str] = None,
+        max_per_group: Optional[int] = BOX_MAX_PER_GROUP
     ) -> pd.DataFrame:
     """
     Dados para boxplot combinado: VALOR_PAGO x área(subárea) color/facet por MODALIDADE.
+    max_per_group: teto de pontos por (área, modalidade) (amostra fixa; None = todos).
     """
-    df = _ensure_numeric_valor(df)
-    df = _filter_year(df, year)
     required = [level, "MODALIDADE"]
 
     for c in required:
         if c not in df.columns:
             raise ValueError(f"Coluna '{c}' ausente.")
-        
+
+    selected_columns = ["ANO_REFERENCIA", "PROCESSO", "MODALIDADE", level, "VALOR_PAGO"]
+    df = _project(df, selected_columns, year)
+
     if level_val is not None:
         if category is not None:
             df = df[(df[level] == level_val) & (df["MODALIDADE"] == category)]
@@ -375,47 +947,140 @@ def agg_box_data_by_area_and_category(
     elif category is not None:
         df = df[df["MODALIDADE"] == category]
 
-    selected_columns = ["ANO_REFERENCIA", "PROCESSO", "MODALIDADE", level, "VALOR_PAGO"]
-    df_clean = df[selected_columns].dropna(subset=["VALOR_PAGO", level, "MODALIDADE"]).copy()
+    df_clean = df.dropna(subset=["VALOR_PAGO", level, "MODALIDADE"])
+    df_clean = _cap_per_group(df_clean, [level, "MODALIDADE"], max_per_group)
     # df_avg = df_clean.groupby([level, "MODALIDADE"], as_index=False).agg({"VALOR_PAGO" : "mean"})
     # df_avg.rename(columns={"VALOR_PAGO":"VALOR_MEDIO"}, inplace=True)
     
     return df_clean
 
 
+@log_call
+def compute_boxplots(
+        df: pd.DataFrame,
+        year: Optional[int] = None,
+        level: Literal["GRANDE_AREA","AREA","SUBAREA"]="AREA",
+        level_val : Optional[str] = None,
+        category : Optional[str] = None,
+        combined: bool = True
+    ) -> Dict[str, pd.DataFrame]:
+    """
+    Os agg_box_data_* da página de boxplots, com os mesmos filtros.
+    combined=False pula o recorte combinado (o facet usa agg_box_summary_by_area_and_category).
+    Retorna: {"category", "area"[, "combined"]} -> mesmo formato das funções individuais.
+    """
+    out = {
+        "category": agg_box_data_by_category(df, year=year, category=category),
+        "area": agg_box_data_by_area(df, year=year, level=level, level_val=level_val),
+    }
+    if combined:
+        out["combined"] = agg_box_data_by_area_and_category(df, year=year, level=level,
+                                                            level_val=level_val, category=category)
+    return out
+
+
+@st_cache_agg
+@log_call
+def agg_box_summary_by_area_and_category(
+        df: pd.DataFrame,
+        year: Optional[int] = None,
+        level: Literal["GRANDE_AREA","AREA","SUBAREA"]="AREA",
+        level_val : Optional[str] = None,
+        category : Optional[str] = None
+    ) -> pd.DataFrame:
+    """
+    Resumo (quartis e cercas) do boxplot combinado por (área, MODALIDADE), com os mesmos
+    filtros de agg_box_data_by_area_and_category. A figura recebe uma linha por grupo
+    em vez de todos os pontos de VALOR_PAGO.
+    Retorna: [<level>, 'MODALIDADE', 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'n'].
+    """
+    # quartis exatos: o resumo usa todas as linhas (a amostra só serve para os pontos do px.box)
+    df_box = agg_box_data_by_area_and_category(df, year=year, level=level, level_val=level_val,
+                                               category=category, max_per_group=None)
+    out = _box_summary(df_box, [level, "MODALIDADE"])
+    return out.astype({level: STRING_DTYPE, "MODALIDADE": STRING_DTYPE})
+
+
+@st_cache_agg
 @log_call
 def agg_time_mean_by_category(df: pd.DataFrame) -> pd.DataFrame:
     """
     Progressão temporal: média de VALOR_PAGO por ANO_REFERENCIA e MODALIDADE.
     Retorna: ['ANO_REFERENCIA','MODALIDADE','media_valor'] com anos ordenados.
     """
-    df = _ensure_numeric_valor(df).copy()
-    df["ANO_REFERENCIA"] = pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").astype("Int64")
-    out = (df.dropna(subset=["ANO_REFERENCIA","MODALIDADE"])
-             .groupby(["ANO_REFERENCIA","MODALIDADE"], as_index=False)
-             .agg(media_valor=("VALOR_PAGO","mean")))
-    out["media_valor"] = out["media_valor"].astype(float)
-    return out.sort_values(["ANO_REFERENCIA","MODALIDADE"], kind="mergesort").reset_index(drop=True)
+    # só leitura das colunas: sem projeção/cópia do df nem to_numeric quando o ano já é inteiro (Int16 do load)
+    df = _ensure_numeric_valor(df)
+    ano = df["ANO_REFERENCIA"]
+    if not is_integer_dtype(ano):
+        ano = pd.to_numeric(ano, errors="coerce").astype("Int64")
+    # anos são inteiros pequenos e contíguos: código = ano - menor ano, sem factorize/hash
+    has_year = ano.notna().to_numpy()
+    y = ano.to_numpy(dtype="int64", na_value=0)
+    y0 = int(y[has_year].min()) if has_year.any() else 0
+    year_codes = np.where(has_year, y - y0, -1)
+    years = np.arange(y0, int(y[has_year].max()) + 1 if has_year.any() else y0)
+
+    # grupo (ano, modalidade) como um único código inteiro: ano_code * n_mod + mod_code
+    mod = df["MODALIDADE"].astype("category")
+    mod_codes = mod.cat.codes.to_numpy()
+    n_mod = len(mod.cat.categories)
+    valid = (year_codes >= 0) & (mod_codes >= 0)
+    keys = year_codes[valid].astype(np.int64) * n_mod + mod_codes[valid]
+    values = df["VALOR_PAGO"].to_numpy(dtype="float64", na_value=np.nan)[valid]
+    has_value = ~np.isnan(values)
+
+    n_groups = len(years) * n_mod
+    sizes = np.bincount(keys, minlength=n_groups)
+    sums = np.bincount(keys[has_value], weights=values[has_value], minlength=n_groups)
+    counts = np.bincount(keys[has_value], minlength=n_groups)
+    keep = np.flatnonzero(sizes)
+    with np.errstate(invalid="ignore"):
+        media = sums[keep] / counts[keep]  # NaN quando o grupo só tem VALOR_PAGO nulo
+    # códigos crescentes = ordem (ANO_REFERENCIA, MODALIDADE); Int64 mantém o contrato da saída
+    return pd.DataFrame({
+        "ANO_REFERENCIA": pd.array(years[keep // n_mod], dtype="Int64"),
+        "MODALIDADE": mod.cat.categories[keep % n_mod].astype(STRING_DTYPE),
+        "media_valor": media,
+    })
 
 
 # =============================================
 # Seção 4 - Gráficos (Plotly) para o Streamlit
 # =============================================
 
+def _bar_figure(data: pd.DataFrame, x: str, y: str, labels: Dict[str, str], title: str,
+                color: str, textposition: Optional[str] = None) -> "go.Figure":
+    """
+    Barras direto em go.Bar (sem a fábrica do px): rótulos "R$ 1,234.56" formatados em Python
+    e passados como text, eixos e hover com os mesmos nomes de labels.
+    """
+    values = data[y].to_numpy(dtype="float64", na_value=np.nan)
+    bar = go.Bar(
+        x=data[x].astype(str).tolist(),
+        y=values,
+        text=["" if np.isnan(v) else f"R$ {v:,.2f}" for v in values],
+        marker_color=color,
+        hovertemplate=f"{labels[x]}=%{{x}}<br>{labels[y]}=%{{y}}<extra></extra>",
+    )
+    if textposition is not None:
+        bar.textposition = textposition
+    fig = go.Figure(bar)
+    fig.update_layout(title=title, xaxis_title=labels[x], yaxis_title=labels[y])
+    return fig
+
+
+@st_cache_fig
 @log_call
 def fig_bar_mean_by_uf(df_agg: pd.DataFrame, year: int) -> "px.Figure":
     if df_agg.empty:
         return px.bar(title=f"Sem dados para exibir em {year}")
 
-    fig = px.bar(
-        df_agg,
-        x="UF",
-        y="media_valor_pago",
-        text="media_valor_pago",
+    fig = _bar_figure(
+        df_agg, x="UF", y="media_valor_pago",
         labels={"UF": "UF", "media_valor_pago": "Média de Valor Pago (R$)"},
         title=f"Média de Valor Pago por UF - {year}",
+        color="#118AB2", textposition="outside",
     )
-    fig.update_traces(texttemplate="R$ %{y:,.2f}", textposition="outside", marker_color="#118AB2")
     fig.update_layout(
         xaxis_tickangle=-30,
         yaxis=dict(tickformat="R$,.2f"),
@@ -426,64 +1091,55 @@ def fig_bar_mean_by_uf(df_agg: pd.DataFrame, year: int) -> "px.Figure":
     return fig
 
 
+@st_cache_fig
 @log_call
 def fig_bar_total_by_region(df_agg: pd.DataFrame, year: Optional[int]) -> "px.Figure":
     title = f"Investimento total por Região" + (f" — {year}" if year else "")
     if df_agg.empty:
         return px.bar(title=f"Sem dados para exibir. {title}")
 
-    fig = px.bar(
-        df_agg,
-        x="REGIAO",
-        y="valor_total",
-        text="valor_total",
+    fig = _bar_figure(
+        df_agg, x="REGIAO", y="valor_total",
         labels={"REGIAO":"Região","valor_total":"Total investido (R$)"},
-        title=title
+        title=title, color="#06D6A0", textposition="outside",
     )
-    fig.update_traces(texttemplate="R$ %{y:,.2f}", textposition="outside", marker_color="#06D6A0")
     fig.update_layout(yaxis=dict(tickformat="R$,.2f"), template="plotly_white", bargap=0.25)
     return fig
 
 
+@st_cache_fig
 @log_call
 def fig_bar_total_by_area(df_agg: pd.DataFrame, year: Optional[int],
                           level: str = "AREA", top_n: Optional[int] = 20) -> "px.Figure":
     title = f"Investimento total por {level.replace('_',' ').title()}" + (f" — {year}" if year else "")
-    data = df_agg.copy()
+    data = df_agg  # nlargest já devolve um frame novo; o px.bar só lê
     if top_n is not None and len(data) > top_n:
         data = data.nlargest(top_n, "valor_total")
     x_col = level
-    fig = px.bar(
-        data,
-        x=x_col,
-        y="valor_total",
-        text="valor_total",
+    fig = _bar_figure(
+        data, x=x_col, y="valor_total",
         labels={x_col: level.replace("_"," ").title(), "valor_total":"Total investido (R$)"},
-        title=title
+        title=title, color="#FFD166",
     )
-    fig.update_traces(texttemplate="R$ %{y:,.2f}", marker_color="#FFD166")
     fig.update_layout(yaxis=dict(tickformat="R$,.2f"), xaxis_tickangle=-30, template="plotly_white", bargap=0.25)
     return fig
 
 
+@st_cache_fig
 @log_call
 def fig_bar_category(df_agg: pd.DataFrame, year: Optional[int], metric_label: str, top_n: Optional[int] = 20) -> "px.Figure":
     """
     Mostra soma / média ponderada por categoria, dependendo do df_agg passado (coluna 'valor_em_reais').
     """
     title = f"Investimento por Categoria de Bolsa ({metric_label})" + (f" — {year}" if year else "")
-    data = df_agg.copy()
+    data = df_agg
     if top_n is not None and len(data) > top_n:
         data = data.nlargest(top_n, "valor_em_reais")
-    fig = px.bar(
-        data,
-        x="MODALIDADE",
-        y="valor_em_reais",
-        text="valor_em_reais",
+    fig = _bar_figure(
+        data, x="MODALIDADE", y="valor_em_reais",
         labels={"MODALIDADE":"Modalidade","valor_em_reais":metric_label},
-        title=title
+        title=title, color="#118AB2",
     )
-    fig.update_traces(texttemplate="R$ %{y:,.2f}", marker_color="#118AB2")
     fig.update_layout(yaxis=dict(tickformat="R$,.2f"), xaxis_tickangle=-30, template="plotly_white", bargap=0.25)
     return fig
 
@@ -575,6 +1231,39 @@ def fig_box_by_area_and_category(df_box: pd.DataFrame, year: Optional[int],
     return fig
 
 
+@st_cache_fig
+@log_call
+def fig_box_summary_by_area_and_category(df_summary: pd.DataFrame, year: Optional[int],
+                                         level: str = "AREA") -> "go.Figure":
+    """
+    Boxplot combinado com facet por categoria a partir do resumo de
+    agg_box_summary_by_area_and_category (go.Box com quartis e cercas já calculados).
+    """
+    title = f"Distribuição do Valor Pago por {level.replace('_',' ').title()} e Categoria" + (f" — {year}" if year else "")
+    if df_summary.empty:
+        return px.box(title=f"Sem dados para exibir. {title}")
+
+    mods = list(dict.fromkeys(df_summary["MODALIDADE"].astype(str)))
+    n_cols = min(3, len(mods))
+    n_rows = -(-len(mods) // n_cols)
+    fig = make_subplots(rows=n_rows, cols=n_cols, shared_yaxes=True,
+                        subplot_titles=[f"MODALIDADE={m}" for m in mods])
+    color = px.colors.qualitative.Set2[0]
+    for i, mod in enumerate(mods):
+        g = df_summary[df_summary["MODALIDADE"].astype(str) == mod]
+        fig.add_trace(go.Box(
+            x=g[level].astype(str).tolist(),
+            q1=g["q1"].tolist(), median=g["median"].tolist(), q3=g["q3"].tolist(),
+            lowerfence=g["lowerfence"].tolist(), upperfence=g["upperfence"].tolist(),
+            name=mod, marker_color=color, boxpoints=False, showlegend=False,
+        ), row=i // n_cols + 1, col=i % n_cols + 1)
+    fig.update_layout(title=title, template="plotly_white")
+    fig.update_yaxes(tickformat="R$,.2f")
+    fig.update_xaxes(tickangle=-30)
+    return fig
+
+
+@st_cache_fig
 @log_call
 def fig_time_mean_by_category(df_time: pd.DataFrame, kind: Literal["line","area"]="line") -> "px.Figure":
     """
@@ -605,7 +1294,28 @@ def fig_time_mean_by_category(df_time: pd.DataFrame, kind: Literal["line","area"
 # Seção 5 - (Opcional) Média por UF por ano (já existente)
 # ======================================================
 
+# tudo que não é letra, removido das siglas de UF (o .pattern vai para o pyarrow.compute)
+_RE_NON_AZ = re.compile(r"[^A-Z]")
+
+def _normalize_uf(s: pd.Series) -> pd.Series:
+    """
+    Sigla em maiúsculas, só letras, até 3 caracteres; kernels do pyarrow.compute sobre os valores distintos.
+    Sai como category (siglas ordenadas): o groupby por UF roda sobre os códigos, sem hash de string.
+    """
+    codes, uniques = pd.factorize(s)
+    arr = pa.array(pd.Series(uniques).astype(STRING_DTYPE))
+    arr = pc.utf8_slice_codeunits(pc.replace_substring_regex(pc.utf8_upper(arr), _RE_NON_AZ.pattern, ""), 0, 3)
+    # valores distintos podem colidir após a limpeza ("sp" e "SP."): refatoriza as siglas
+    uf_codes, ufs = pd.factorize(pd.array(arr, dtype=STRING_DTYPE), sort=True)
+    codes = np.where(codes >= 0, uf_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=ufs), index=s.index, name=s.name)
+
 def _choose_uf_column(df: pd.DataFrame, preference: Optional[str] = None) -> str:
+    """
+    Coluna de UF a usar: a preferida, se existir; senão a de maior cobertura (não nulos).
+    A cobertura do df carregado vem memoizada em df.attrs["uf_coverage"] (contada uma vez
+    no load); só recortes/dfs avulsos contam de novo.
+    """
     dest_exists = "SIGLA_UF_DESTINO" in df.columns
     orig_exists = "SIGLA_UF_ORIGEM" in df.columns
 
@@ -615,8 +1325,14 @@ def _choose_uf_column(df: pd.DataFrame, preference: Optional[str] = None) -> str
         return "SIGLA_UF_ORIGEM"
 
     if dest_exists and orig_exists:
-        nd = df["SIGLA_UF_DESTINO"].notna().sum()
-        no = df["SIGLA_UF_ORIGEM"].notna().sum()
+        # df carregado: cobertura já contada no load; recortes/cópias contam de novo
+        coverage = df.attrs.get("uf_coverage", {}) if _dataset_id(df) is not None else {}
+        if "DESTINO" in coverage and "ORIGEM" in coverage:
+            nd, no = coverage["DESTINO"], coverage["ORIGEM"]
+        else:
+            # count() conta os não nulos direto, sem materializar a máscara booleana
+            nd = df["SIGLA_UF_DESTINO"].count()
+            no = df["SIGLA_UF_ORIGEM"].count()
         return "SIGLA_UF_DESTINO" if nd >= no else "SIGLA_UF_ORIGEM"
     if dest_exists:
         return "SIGLA_UF_DESTINO"
@@ -625,30 +1341,54 @@ def _choose_uf_column(df: pd.DataFrame, preference: Optional[str] = None) -> str
     raise ValueError("Nenhuma coluna de UF encontrada no dataset.")
 
 
+@st_cache_agg
 @log_call
-def mean_valor_pago_by_uf_for_year(df: pd.DataFrame, year: int, uf_preference: Optional[str] = None) -> pd.DataFrame:
+def agg_mean_by_uf_all_years(df: pd.DataFrame, uf_preference: Optional[str] = None) -> pd.DataFrame:
+    """
+    Média de VALOR_PAGO por (ano, UF) de todos os anos numa passada só.
+    O resultado tem ~30 linhas por ano: trocar o ano no seletor só recorta este frame.
+    Retorna: ['ANO_REFERENCIA','UF','media_valor_pago','n'].
+    """
     required = ["ANO_REFERENCIA", "VALOR_PAGO"]
     for c in required:
         if c not in df.columns:
             raise ValueError(f"Coluna obrigatória ausente: {c}")
 
-    df = df.copy()
-    if not is_numeric_dtype(df["VALOR_PAGO"]):
-        df["VALOR_PAGO"] = pd.to_numeric(df["VALOR_PAGO"], errors="coerce")
-    df["ANO_REFERENCIA"] = pd.to_numeric(df["ANO_REFERENCIA"], errors="coerce").astype("Int64")
-
     uf_col = _choose_uf_column(df, preference=uf_preference)
-    df[uf_col] = df[uf_col].astype("string").str.upper().str.replace(r"[^A-Z]", "", regex=True).str[:3]
 
-    df_year = df[df["ANO_REFERENCIA"] == year]
+    sub = _project(df, ["ANO_REFERENCIA", "VALOR_PAGO", uf_col])
+    ano = sub["ANO_REFERENCIA"]
+    if not is_integer_dtype(ano):
+        ano = pd.to_numeric(ano, errors="coerce").astype("Int64")
+    # df carregado: UF já normalizada no load; recortes/dfs avulsos normalizam aqui
+    uf = sub[uf_col] if _dataset_id(df) is not None else _normalize_uf(sub[uf_col])
+    sub = pd.DataFrame({"ANO_REFERENCIA": ano, "UF": uf, "VALOR_PAGO": sub["VALOR_PAGO"]})
 
+    # dropna=True do próprio groupby descarta as chaves nulas: sem o dropna que copiava o frame
     out = (
-        df_year.dropna(subset=[uf_col])
-              .groupby(uf_col, as_index=False)
-              .agg(media_valor_pago=("VALOR_PAGO", "mean"),
-                   n=("VALOR_PAGO", "size"))
-              .rename(columns={uf_col: "UF"})
+        sub.groupby(["ANO_REFERENCIA", "UF"], as_index=False, observed=True, dropna=True)
+           .agg(media_valor_pago=("VALOR_PAGO", "mean"),
+                n=("VALOR_PAGO", "size"))
     )
+    # mean do Int32 sai Float64 (mascarado): aqui o astype converte de fato para float64
     out["media_valor_pago"] = out["media_valor_pago"].astype(float)
     out["UF"] = out["UF"].astype(str)
-    return out.sort_values("media_valor_pago", ascending=False, kind="mergesort").reset_index(drop=True)
+    # size sobre a chave category sai Int64: volta ao int64 das outras contagens
+    out["n"] = out["n"].astype("int64")
+    return out
+
+
+@log_call
+def mean_valor_pago_by_uf_for_year(df: pd.DataFrame, year: int, uf_preference: Optional[str] = None) -> pd.DataFrame:
+    required = ["ANO_REFERENCIA", "VALOR_PAGO"]
+    for c in required:
+        if c not in df.columns:
+            raise ValueError(f"Coluna obrigatória ausente: {c}")
+
+    # recorte do agregado (ano, UF) memoizado; já vem ordenado por UF dentro do ano
+    agg = agg_mean_by_uf_all_years(df, uf_preference=uf_preference)
+    out = agg.loc[agg["ANO_REFERENCIA"] == year, ["UF", "media_valor_pago", "n"]]
+    out = out.sort_values("media_valor_pago", ascending=False, kind="mergesort").reset_index(drop=True)
+    # arredonda uma vez aqui: figura e tabela usam o mesmo frame, sem .assign/cópia no chamador
+    out["media_valor_pago"] = out["media_valor_pago"].round(2)
+    return out